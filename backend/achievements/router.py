@@ -0,0 +1,17 @@
+from fastapi import APIRouter, Depends, Response
+from auth.utils import get_current_user
+from auth.schemas import CurrentUser
+from database import ReadSessionDep
+from achievements.utils import get_my_achievements
+from utils import envelope
+
+router = APIRouter(
+    prefix="/achievements",
+    tags=["achievements"]
+)
+
+
+@router.get("/me")
+async def my_achievements(session: ReadSessionDep, response: Response, user: CurrentUser = Depends(get_current_user)):
+    achievements = await get_my_achievements(user, session)
+    return envelope("Earned achievements", achievements, response)
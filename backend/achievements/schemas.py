@@ -0,0 +1,23 @@
+from pydantic import BaseModel
+from typing import List
+from datetime import datetime
+
+
+class MyAchievement(BaseModel):
+    id: int
+    title: str
+    description: str | None
+    image_url: str | None
+    type: str
+    qty: int
+    date_earned: datetime
+
+
+class AchievementCounter(BaseModel):
+    type: str
+    count: int
+
+
+class MyAchievements(BaseModel):
+    achievements: List[MyAchievement] = []
+    counters: List[AchievementCounter] = []  # progress towards the next thresholds
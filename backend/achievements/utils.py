@@ -0,0 +1,259 @@
+from bisect import bisect_right
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime
+from sqlalchemy import select, func, event, inspect
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from auth.schemas import CurrentUser
+from database import async_session_maker
+from models import Achievement, UserAchievement, UserAchievementCounter
+from achievements.schemas import MyAchievement, AchievementCounter, MyAchievements
+from metrics import Counter
+from utils import internal_error
+from config import config
+import asyncio
+import logging
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+achievement_events = Counter("achievement_events_total", "Achievement events consumed by type.", ("type",))
+achievements_awarded = Counter("achievements_awarded_total", "Achievements awarded by type.", ("type",))
+
+
+@dataclass
+class Thresholds:
+    qtys: list[int] = field(default_factory=list)  # ascending
+    achievement_ids: list[int] = field(default_factory=list)  # same order as qtys
+
+
+class AchievementRules:
+    '''
+    Achievement rules indexed by type, each type holds its thresholds in ascending order.
+
+    Rules are loaded once and dropped when an Achievement is written in this process,
+    or after ttl seconds so edits made by other workers are picked up.
+    '''
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._rules: dict[str, Thresholds] | None = None
+        self._loaded_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def get(self, session: AsyncSession) -> dict[str, Thresholds]:
+        rules = self._rules
+        if rules is not None and time.monotonic() - self._loaded_at < self.ttl:
+            return rules
+
+        async with self._lock:
+            if self._rules is rules:
+                data = await session.execute(
+                    select(Achievement.id, Achievement.type, Achievement.qty).order_by(Achievement.qty, Achievement.id)
+                )
+                loaded = defaultdict(Thresholds)
+                for achievement_id, achievement_type, qty in data.all():
+                    loaded[achievement_type].qtys.append(qty)
+                    loaded[achievement_type].achievement_ids.append(achievement_id)
+                self._rules, self._loaded_at = dict(loaded), time.monotonic()
+        return self._rules
+
+    def invalidate(self) -> None:
+        self._rules = None
+
+    # achievements of a type with threshold in (old_count, new_count]
+    @staticmethod
+    def crossed(thresholds: Thresholds, old_count: int, new_count: int) -> list[int]:
+        start = bisect_right(thresholds.qtys, old_count)
+        end = bisect_right(thresholds.qtys, new_count)
+        return thresholds.achievement_ids[start:end]
+
+
+achievement_rules = AchievementRules(ttl=config.ACHIEVEMENT_RULES_TTL)
+
+
+######## RULE INVALIDATION ON ORM WRITES #########
+# new rules and rules with a changed threshold are also backfilled to users whose counters already reach them
+@event.listens_for(Session, "after_flush")
+def collect_achievement_changes(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, Achievement):
+            session.info["achievement_rules_changed"] = True
+            if obj in session.deleted:
+                continue
+            attrs = inspect(obj).attrs
+            if obj in session.new or attrs.qty.history.has_changes() or attrs.type.history.has_changes():
+                session.info.setdefault("achievement_backfill", set()).add(obj.id)
+
+
+@event.listens_for(Session, "after_commit")
+def invalidate_achievement_rules(session):
+    if session.info.pop("achievement_rules_changed", False):
+        achievement_rules.invalidate()
+    achievement_ids = session.info.pop("achievement_backfill", None)
+    if achievement_ids:
+        achievement_backfill.schedule(achievement_ids)
+
+
+@event.listens_for(Session, "after_rollback")
+def discard_achievement_changes(session):
+    session.info.pop("achievement_rules_changed", None)
+    session.info.pop("achievement_backfill", None)
+##################################################
+
+
+######## RULE BACKFILL #########
+# users whose counter already reaches the threshold of the achievements get them in one INSERT ... SELECT
+# from the counters (history is not rescanned). Returns awarded (user_id, achievement_id) pairs
+async def backfill_achievements(session: AsyncSession, achievement_ids: set[int]) -> list[tuple[int, int]]:
+    reached = select(
+        UserAchievementCounter.user_id, Achievement.id, func.now()
+    ).join(
+        UserAchievementCounter,
+        (UserAchievementCounter.type == Achievement.type) & (UserAchievementCounter.count >= Achievement.qty)
+    ).filter(Achievement.id.in_(achievement_ids))
+
+    data = await session.execute(
+        insert(UserAchievement).from_select(
+            [UserAchievement.user_id, UserAchievement.achievement_id, UserAchievement.date_earned], reached
+        ).on_conflict_do_nothing(
+            index_elements=[UserAchievement.user_id, UserAchievement.achievement_id]
+        ).returning(UserAchievement.user_id, UserAchievement.achievement_id)
+    )
+    return [(row.user_id, row.achievement_id) for row in data.all()]
+
+
+class AchievementBackfill:
+    '''
+    Backfills changed rules once they are committed, and once more after the rules ttl:
+    events consumed meanwhile by workers still holding the old rules are caught by the second run.
+    '''
+
+    def __init__(self, delay: float, session_maker=async_session_maker):
+        self.delay = delay
+        self.session_maker = session_maker
+        self._tasks: set[asyncio.Task] = set()
+
+    # called from sync ORM events, runs as a task on the running loop,
+    # without a loop (scripts, sync sessions) a single backfill runs right away
+    def schedule(self, achievement_ids: set[int]) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            asyncio.run(self.backfill(set(achievement_ids)))
+            return
+        task = loop.create_task(self._run(set(achievement_ids)))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, achievement_ids: set[int]) -> None:
+        await self.backfill(achievement_ids)
+        await asyncio.sleep(self.delay)
+        await self.backfill(achievement_ids)
+
+    async def backfill(self, achievement_ids: set[int]) -> None:
+        try:
+            async with self.session_maker() as session:
+                awarded = await backfill_achievements(session, achievement_ids)
+                await session.commit()
+                if awarded:
+                    data = await session.execute(
+                        select(Achievement.id, Achievement.type).filter(Achievement.id.in_(achievement_ids))
+                    )
+                    types = dict(data.all())
+                    for _, achievement_id in awarded:
+                        achievements_awarded.inc(types.get(achievement_id, "unknown"))
+        except SQLAlchemyError as e:
+            logger.warning("achievement backfill of %s failed: %s", sorted(achievement_ids), e)
+
+
+achievement_backfill = AchievementBackfill(delay=config.ACHIEVEMENT_RULES_TTL)
+################################
+
+
+######## EVENT CONSUMPTION #########
+# events are (user_id, achievement type, count) - e.g. (1, 'lesson_completion', 3) for three lessons completed.
+# counters are incremented in one upsert, thresholds crossed by the increment are awarded in one insert,
+# history is never rescanned. Runs inside the caller's transaction.
+
+async def record_achievement_events(session: AsyncSession, events: list[tuple[int, str, int]]) -> list[tuple[int, int]]:
+    increments = defaultdict(int)
+    for user_id, achievement_type, count in events:
+        if count > 0:
+            increments[(user_id, achievement_type)] += count
+    if not increments:
+        return []
+
+    # rows are locked in (user_id, type) order so concurrent batches cannot deadlock
+    stmt = insert(UserAchievementCounter).values([
+        {"user_id": user_id, "type": achievement_type, "count": count}
+        for (user_id, achievement_type), count in sorted(increments.items())
+    ])
+    data = await session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[UserAchievementCounter.user_id, UserAchievementCounter.type],
+            set_={"count": UserAchievementCounter.count + stmt.excluded.count}
+        ).returning(UserAchievementCounter.user_id, UserAchievementCounter.type, UserAchievementCounter.count)
+    )
+
+    rules = await achievement_rules.get(session)
+    earned = []
+    for user_id, achievement_type, new_count in data.all():
+        increment = increments[(user_id, achievement_type)]
+        achievement_events.inc(achievement_type, amount=increment)
+        thresholds = rules.get(achievement_type)
+        if thresholds is not None:
+            for achievement_id in AchievementRules.crossed(thresholds, new_count - increment, new_count):
+                earned.append((user_id, achievement_id))
+    if not earned:
+        return []
+
+    now = datetime.now()
+    data = await session.execute(
+        insert(UserAchievement).values([
+            {"user_id": user_id, "achievement_id": achievement_id, "date_earned": now}
+            for user_id, achievement_id in earned
+        ]).on_conflict_do_nothing(
+            index_elements=[UserAchievement.user_id, UserAchievement.achievement_id]
+        ).returning(UserAchievement.user_id, UserAchievement.achievement_id)
+    )
+    awarded = [(row.user_id, row.achievement_id) for row in data.all()]
+
+    types = {achievement_id: achievement_type
+             for achievement_type, thresholds in rules.items() for achievement_id in thresholds.achievement_ids}
+    for _, achievement_id in awarded:
+        achievements_awarded.inc(types.get(achievement_id, "unknown"))
+    return awarded
+####################################
+
+
+# earned achievements and counters of the user
+async def get_my_achievements(user: CurrentUser, session: AsyncSession) -> MyAchievements:
+    try:
+        earned = await session.execute(
+            select(Achievement, UserAchievement.date_earned).join(
+                UserAchievement, UserAchievement.achievement_id == Achievement.id
+            ).filter(UserAchievement.user_id == user.id).order_by(UserAchievement.date_earned, Achievement.id)
+        )
+        counters = await session.execute(
+            select(UserAchievementCounter.type, UserAchievementCounter.count).filter(
+                UserAchievementCounter.user_id == user.id
+            ).order_by(UserAchievementCounter.type)
+        )
+    except SQLAlchemyError:
+        raise internal_error
+
+    return MyAchievements(
+        achievements=[
+            MyAchievement(id=achievement.id, title=achievement.title, description=achievement.description,
+                          image_url=achievement.image_url, type=achievement.type, qty=achievement.qty,
+                          date_earned=date_earned)
+            for achievement, date_earned in earned.all()
+        ],
+        counters=[AchievementCounter(type=achievement_type, count=count) for achievement_type, count in counters.all()]
+    )
@@ -1,11 +1,50 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Header, HTTPException, status
+from fastapi.responses import PlainTextResponse
+from contextlib import asynccontextmanager
 from auth.router import router as auth_router
 from guest.router import router as guest_router
 from user.router import router as user_router
+from leaderboard.router import router as leaderboard_router
+from achievements.router import router as achievements_router
+from quiz.router import router as quiz_router
+from mailer.dispatcher import dispatcher
+from user.progress import lesson_view_recorder
+from instrumentation import QueryStatsMiddleware
+from metrics import MetricsMiddleware, render as render_metrics
+from config import config
+import secrets
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    lesson_view_recorder.start()
+    if config.EMAIL_DISPATCHER_ENABLED:
+        dispatcher.start()
+    yield
+    if config.EMAIL_DISPATCHER_ENABLED:
+        await dispatcher.stop()
+    # write buffered lesson views before the process exits
+    await lesson_view_recorder.stop()
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(QueryStatsMiddleware)
+if config.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics(authorization: str = Header(default="")):
+        if config.METRICS_TOKEN and not secrets.compare_digest(authorization, f"Bearer {config.METRICS_TOKEN}"):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail={"success": False, "message": "Invalid metrics token.", "data": None}
+            )
+        return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
 
-app = FastAPI()
 app.include_router(auth_router, prefix="/api")
 app.include_router(guest_router, prefix="/api")
 app.include_router(user_router, prefix="/api")
-
+app.include_router(leaderboard_router, prefix="/api")
+app.include_router(achievements_router, prefix="/api")
+app.include_router(quiz_router, prefix="/api")
 
@@ -0,0 +1,122 @@
+from concurrent.futures import ThreadPoolExecutor
+from config import config
+from metrics import Histogram, Gauge, Counter, register_collector
+import asyncio
+import threading
+import time
+import bcrypt
+
+
+password_hash_duration = Histogram("password_hash_duration_seconds", "Time spent in bcrypt per job.", ("operation",),
+                                   buckets=(0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 1.0, 2.5))
+password_hash_queue = Gauge("password_hash_queue_depth", "bcrypt jobs waiting for a worker thread.")
+password_hash_running = Gauge("password_hash_running", "bcrypt jobs being executed.")
+password_hash_rejected = Counter("password_hash_rejected_total", "bcrypt jobs rejected because the pool was full.")
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when the hashing pool already has max_pending jobs waiting or running."""
+
+
+class PasswordHasher:
+    '''
+    Runs bcrypt in a bounded thread pool so hashing never blocks the event loop.
+    bcrypt releases the GIL while hashing, so threads give real parallelism here.
+
+    Args:
+        workers (int): number of worker threads
+        max_pending (int): jobs allowed in the pool (running + queued) before new ones are rejected
+        rounds (int): bcrypt cost factor for new hashes
+    '''
+
+    def __init__(self, workers: int, max_pending: int, rounds: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.rounds = rounds
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._lock = threading.Lock()
+
+        # metrics
+        self.pending = 0  # running + queued jobs
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.max_queue_depth = 0
+        self.busy_seconds = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        return max(self.pending - self.running, 0)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "running": self.running,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "busy_seconds": self.busy_seconds,
+        }
+
+    def hash_sync(self, password: str) -> str:
+        salt = bcrypt.gensalt(rounds=self.rounds)
+        return bcrypt.hashpw(password.encode("utf-8"), salt).decode("utf-8")
+
+    def verify_sync(self, password: str, hashed_password: str) -> bool:
+        return bcrypt.checkpw(password.encode("utf-8"), hashed_password.encode("utf-8"))
+
+    async def hash(self, password: str) -> str:
+        return await self._submit(self.hash_sync, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self._submit(self.verify_sync, password, hashed_password)
+
+    async def _submit(self, func, *args):
+        # back-pressure: fail fast instead of letting the queue grow without limit
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise PasswordHasherBusy()
+
+        self.pending += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, self._run, func, *args)
+        finally:
+            self.pending -= 1
+
+    def _run(self, func, *args):
+        with self._lock:
+            self.running += 1
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+                self.busy_seconds += elapsed
+            password_hash_duration.observe(elapsed, func.__name__.removesuffix("_sync"))
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True)
+
+
+password_hasher = PasswordHasher(
+    workers=config.PASSWORD_HASH_WORKERS,
+    max_pending=config.PASSWORD_HASH_MAX_PENDING,
+    rounds=config.BCRYPT_ROUNDS
+)
+
+
+def collect_password_hasher_metrics() -> None:
+    password_hash_queue.set(password_hasher.queue_depth)
+    password_hash_running.set(password_hasher.running)
+    password_hash_rejected.set_total(password_hasher.rejected)
+
+
+register_collector(collect_password_hasher_metrics)
@@ -1,26 +1,30 @@
-from fastapi import APIRouter, Depends, Response, Request, HTTPException, status, BackgroundTasks
+from fastapi import APIRouter, Depends, Response, Request, HTTPException, status
 from auth.schemas import UserLogin, UserSignUp, BaseUser
 from models import User
 from database import SessionDep
 from sqlalchemy import select
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
-from auth.utils import (verify_password, create_token, get_password_hash, 
-                        get_user_by_username, set_token_to_cookies,
-                        send_email_verification_token, get_username)
+from auth.utils import (verify_password_async, create_token, get_password_hash_async, 
+                        get_user_by_username, get_current_user, set_token_to_cookies,
+                        queue_email_verification_token, get_username)
+from mailer.dispatcher import dispatcher
 from config import config
+from utils import envelope
 
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 # create new user endpoint
 @router.post("/sign_up", status_code=status.HTTP_201_CREATED)
-async def sign_up(user_data: UserSignUp, response: Response, session: SessionDep, background_tasks: BackgroundTasks):  
+async def sign_up(user_data: UserSignUp, response: Response, session: SessionDep):  
     user_data_dict = user_data.model_dump()
-    user_data_dict.setdefault("password_hash", get_password_hash(user_data_dict["password"]))
+    user_data_dict.setdefault("password_hash", await get_password_hash_async(user_data_dict["password"]))
     user_data_dict.pop("password")
     user = User(**user_data_dict)
     try:
         session.add(user)
+        # verification email is stored in the same transaction as the user
+        queue_email_verification_token(user, session)
         await session.commit()
     except IntegrityError as e:
         error_data = str(e.orig).split("DETAIL")[1]
@@ -45,21 +49,14 @@ async def sign_up(user_data: UserSignUp, response: Response, session: SessionDep
     await set_token_to_cookies(access_token, "access", response)
     await set_token_to_cookies(refresh_token, "refresh", response)
 
-    return_value = {
-        "detail":{
-            "success": True,
-            "message": "New user was successfully created. Email verification link was sent to your address.",
-            "data": {
-                "username": user.username,
-                "email": user.email
-            }
-        }
-    }
+    # wake email dispatcher
+    dispatcher.notify()
 
-    # send email in background
-    background_tasks.add_task(send_email_verification_token, user)
-
-    return return_value
+    return envelope(
+        "New user was successfully created. Email verification link was sent to your address.",
+        {"username": user.username, "email": user.email},
+        response, status_code=status.HTTP_201_CREATED, key="detail"
+    )
 
 
 # login endpoint
@@ -86,7 +83,7 @@ async def sign_in(form_data: UserLogin, response: Response, session: SessionDep)
             }
         )
 
-    verification_result = verify_password(form_data.password, user.password_hash)
+    verification_result = await verify_password_async(form_data.password, user.password_hash)
 
     if verification_result:
         access_token = create_token({"username":user.username})
@@ -104,38 +101,19 @@ async def sign_in(form_data: UserLogin, response: Response, session: SessionDep)
     await set_token_to_cookies(access_token, "access", response)
     await set_token_to_cookies(refresh_token, "refresh", response)
 
-    return_value = {
-        "detail": {
-            "success": True,
-            "message": f"User with username {form_data.username} successfully signed in.",
-            "data": None
-        }
-    }
-    return return_value
+    return envelope(f"User with username {form_data.username} successfully signed in.", None, response, key="detail")
 
 # logout endpoint
 @router.post("/sign_out")
 async def sign_out(response: Response):
     response.delete_cookie(key="access_token")
     response.delete_cookie(key="refresh_token")
-    return {
-        "detail": {
-            "success": True,
-            "message": "User signed out successfully",
-            "data": None
-        }
-    }
+    return envelope("User signed out successfully", None, response, key="detail")
 
 # get current user
 @router.get("/active_user")
-async def active_user(user = Depends(get_user_by_username)):
-    return {
-        "details": {
-            "success": True,
-            "message": f"User is authenticated",
-            "data": BaseUser.model_validate(user)
-        }
-    }
+async def active_user(response: Response, user = Depends(get_current_user)):
+    return envelope("User is authenticated", BaseUser.model_validate(user), response)
 
 @router.get("/email_verify/{verify_token}")
 async def email_verify(verify_token, session: SessionDep):
@@ -26,6 +26,24 @@ class BaseUser(BaseModel):
     class Config:
         from_attributes = True
 
+# authenticated user as seen by request handlers (cached between requests)
+class CurrentUser(BaseModel):
+    id: int
+    username: str
+    email: EmailStr
+    first_name: str
+    last_name: str
+    middle_name: str | None
+    date_of_birth: date
+    gender: bool
+    email_verified: bool
+    is_admin: bool
+    is_active: bool
+    profile_picture: str | None
+
+    class Config:
+        from_attributes = True
+
 class UserLogin(BaseModel):
     username: str
     password: str
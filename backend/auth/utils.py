@@ -1,16 +1,31 @@
 from jose import jwt, JWTError, ExpiredSignatureError
 from datetime import datetime, timedelta, timezone
 from config import config
-import bcrypt
+from auth.hashing import password_hasher, PasswordHasherBusy
+from utils import service_busy_error
 from fastapi.exceptions import HTTPException
 from fastapi import status, Request, Response, Depends
 from models import User
 from database import SessionDep
-from sqlalchemy import select
+from sqlalchemy import select, event, inspect
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from auth.schemas import CurrentUser
+from cache import TTLCache
+from metrics import Histogram, Counter
+import time
 
-import smtplib
-from email.mime.text import MIMEText
+from sqlalchemy.ext.asyncio import AsyncSession
+from mailer.dispatcher import enqueue_email
+
+
+token_cache = TTLCache(maxsize=config.TOKEN_CACHE_SIZE)
+user_cache = TTLCache(maxsize=config.USER_CACHE_SIZE, ttl=config.USER_CACHE_TTL)
+refreshed_tokens = TTLCache(maxsize=config.TOKEN_CACHE_SIZE, ttl=config.TOKEN_REFRESH_GRACE_SECONDS)
+
+jwt_duration = Histogram("jwt_duration_seconds", "Time spent encoding and verifying JWTs.", ("operation",),
+                         buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01))
+token_cache_lookups = Counter("token_cache_lookups_total", "Verified token cache lookups.", ("result",))
 
 
 ####### WORKING WITH PASSWORDS & TOKENS #########
@@ -24,17 +39,28 @@ def get_password_hash(password: str) -> str:
     Returns:
         str: Hash of a plain password 
     '''
-    encoded_pass = password.encode("utf-8")
-    salt = bcrypt.gensalt()
-    hash = bcrypt.hashpw(encoded_pass, salt)
-    return hash.decode("utf-8")
+    return password_hasher.hash_sync(password)
 
 
 # compare password with password hash
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    encoded_pass = plain_password.encode("utf-8")
-    encoded_hash = hashed_password.encode("utf-8")
-    return bcrypt.checkpw(encoded_pass, encoded_hash)
+    return password_hasher.verify_sync(plain_password, hashed_password)
+
+
+# hashing password in worker pool (use inside request handlers)
+async def get_password_hash_async(password: str) -> str:
+    try:
+        return await password_hasher.hash(password)
+    except PasswordHasherBusy:
+        raise service_busy_error
+
+
+# compare password with password hash in worker pool (use inside request handlers)
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    try:
+        return await password_hasher.verify(plain_password, hashed_password)
+    except PasswordHasherBusy:
+        raise service_busy_error
 
 
 # create access/refresh token (data will contain only username)
@@ -47,7 +73,38 @@ def create_token(data: dict, type: str = "access", secret_key: str = config.JWT_
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + timedelta(minutes=exp_minutes)
     to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, secret_key, algorithm=config.JWT_ALGORITHM)
+    with jwt_duration.time("encode"):
+        return jwt.encode(to_encode, secret_key, algorithm=config.JWT_ALGORITHM)
+
+
+# decode token, verified claims are cached until the token expires
+def decode_token(token: str, secret_key: str = config.JWT_SECRET_KEY) -> dict:
+    claims = token_cache.get((token, secret_key))
+    if claims is not None:
+        token_cache_lookups.inc("hit")
+        return claims
+    token_cache_lookups.inc("miss")
+
+    # raises ExpiredSignatureError / JWTError
+    with jwt_duration.time("decode"):
+        claims = jwt.decode(token, secret_key, algorithms=[config.JWT_ALGORITHM])
+
+    ttl = claims.get("exp", 0) - time.time()
+    if ttl > 0:
+        token_cache.set((token, secret_key), claims, ttl=ttl)
+    return claims
+
+
+# mint new access/refresh pair for a refresh token
+# single-flight: every request presenting the same refresh token within the grace window
+# gets the pair minted by the first one (minting does not await, so check-and-set cannot interleave)
+def refresh_token_pair(refresh_token: str, username: str) -> tuple[str, str]:
+    pair = refreshed_tokens.get(refresh_token)
+    if pair is None:
+        data = {"username": username}
+        pair = (create_token(data), create_token(data, type="refresh"))
+        refreshed_tokens.set(refresh_token, pair)
+    return pair
 ########################################
 
 ######## UTILS AS DEPENDENCIES #########
@@ -67,7 +124,7 @@ async def get_username(token: str, secret_key = config.JWT_SECRET_KEY) -> str |
             # raise error of unauthorized access because no access token was found
             raise JWTError()
     
-        token_credentials = jwt.decode(token, secret_key, algorithms=[config.JWT_ALGORITHM])
+        token_credentials = decode_token(token, secret_key)
         return token_credentials["username"]
     except (ExpiredSignatureError, JWTError):
         raise invalid_err
@@ -92,7 +149,7 @@ async def get_username_from_token(request: Request, response: Response) -> str |
             # raise error of unauthorized access because no access token was found
             raise JWTError()
 
-        access_token_credentials = jwt.decode(access_token_from_cookie, config.JWT_SECRET_KEY, algorithms=[config.JWT_ALGORITHM])
+        access_token_credentials = decode_token(access_token_from_cookie)
         return access_token_credentials["username"]
     
     except (ExpiredSignatureError, JWTError):
@@ -104,35 +161,19 @@ async def get_username_from_token(request: Request, response: Response) -> str |
         
         # decode refresh token if exists
         try:
-            refresh_token_credentials = jwt.decode(refresh_token_from_cookies, config.JWT_SECRET_KEY, algorithms=[config.JWT_ALGORITHM])
+            refresh_token_credentials = decode_token(refresh_token_from_cookies)
             # if refresh token is valid, then generate new access token and refresh tokens for the username
-            # new access and refresh tokens
-            data = {
-            "username": refresh_token_credentials["username"]
-            }
-            response.set_cookie(
-                key="access_token", 
-                value=create_token(data), 
-                httponly=True,  # Makes the cookie HTTP-only
-                secure=True,  # Use secure flag for HTTPS connections
-                max_age=timedelta(minutes=config.JWT_EXPIRATION_TIME),  # Expiration time
-                expires=datetime.now(timezone.utc) + timedelta(minutes=config.JWT_EXPIRATION_TIME)  # Cookie expiration
-            )
+            # (concurrent requests with the same refresh token get the same new pair)
+            access_token, refresh_token = refresh_token_pair(
+                refresh_token_from_cookies, refresh_token_credentials["username"])
 
-            response.set_cookie(
-                key="refresh_token", 
-                value=create_token(data, type="refresh"), 
-                httponly=True,  # Makes the cookie HTTP-only
-                secure=True,  # Use secure flag for HTTPS connections
-                max_age=timedelta(days=config.JWT_REFRESH_EXPIRATION_TIME),  # Expiration time
-                expires=datetime.now(timezone.utc) + timedelta(days=config.JWT_REFRESH_EXPIRATION_TIME)  # Cookie expiration
-            )
+            await set_token_to_cookies(access_token, "access", response)
+            await set_token_to_cookies(refresh_token, "refresh", response)
 
             return refresh_token_credentials["username"]
           
-        except (ExpiredSignatureError, JWTError) as e:
+        except (ExpiredSignatureError, JWTError):
             # if refresh token is expired or invalid, then raise error of unauthorized access
-            print(e)
             raise unauthorized_err
 
 async def set_token_to_cookies(token: str, type: str, response: Response) -> None:
@@ -155,7 +196,7 @@ async def set_token_to_cookies(token: str, type: str, response: Response) -> Non
                 value=token, 
                 httponly=True,  # Makes the cookie HTTP-only
                 secure=True,  # Use secure flag for HTTPS connections
-                max_age=timedelta(minutes=exp_minutes),  # Expiration time
+                max_age=exp_minutes * 60,  # Expiration time in seconds
                 expires=datetime.now(timezone.utc) + timedelta(minutes=exp_minutes)  # Cookie expiration
             )
 
@@ -177,6 +218,20 @@ async def get_user_by_username(session: SessionDep, username: str | None = Depen
                 "message": "Server internal error occured. Try again later."
             })
 
+# authenticated user for request handlers, served from user cache when possible
+async def get_current_user(session: SessionDep, username: str | None = Depends(get_username_from_token)) -> CurrentUser | None:
+    current_user = user_cache.get(username)
+    if current_user is not None:
+        return current_user
+
+    user = await get_user_by_username(session=session, username=username)
+    if user is None:
+        return None
+
+    current_user = CurrentUser.model_validate(user)
+    user_cache.set(username, current_user)
+    return current_user
+
 # find user by filter
 async def find_user_by_filter(filter_by,  session: SessionDep) -> User | None:
     statement = select(User).filter_by(**filter_by)
@@ -186,29 +241,46 @@ async def find_user_by_filter(filter_by,  session: SessionDep) -> User | None:
 ###################################################
     
 
+####### CACHE INVALIDATION ON USER CHANGES ###########
+# drop cached principals of users changed in the flush (profile, ban) once committed
+@event.listens_for(Session, "after_flush")
+def collect_changed_usernames(session, flush_context):
+    usernames = session.info.setdefault("changed_usernames", set())
+    for obj in (*session.dirty, *session.deleted):
+        if isinstance(obj, User):
+            usernames.add(obj.username)
+            usernames.update(inspect(obj).attrs.username.history.deleted)
+
+
+@event.listens_for(Session, "after_commit")
+def invalidate_changed_usernames(session):
+    usernames = session.info.pop("changed_usernames", None)
+    if usernames:
+        user_cache.delete(*usernames)
+
+
+@event.listens_for(Session, "after_rollback")
+def discard_changed_usernames(session):
+    session.info.pop("changed_usernames", None)
+#######################################################
+
+
 ####### EMAIL VERIFICATION ##########
-async def send_email_verification_token(user: User):    
+# put verification email to outbox, it is delivered by mailer.dispatcher after commit
+def queue_email_verification_token(user: User, session: AsyncSession) -> None:
     email_verification_token = create_token(
         {"username": user.username},
         secret_key=config.EMAIL_VERIFICATION_SECRET_KEY
     )
 
-    link_to_send = config.WEB_APP_DOMAIN + f"/api/auth/email-verify/{email_verification_token}"
-
+    link_to_send = config.WEB_APP_DOMAIN + f"/api/auth/email_verify/{email_verification_token}"
 
-    msg = MIMEText(f"Hello, {User.first_name}\n\nYour verification link is {link_to_send}") 
-    msg["Subject"] = "Testing email"
-    msg["From"] = config.EMAIL
-    msg["To"] = user.email
-
-    with smtplib.SMTP_SSL(config.EMAIL_SMTP_SERVER, config.EMAIL_SMTP_SERVER_PORT) as smtp_server:
-        # Login to the SMTP server using the sender's credentials.
-
-        smtp_server.login(config.EMAIL, config.EMAIL_PASS)
-        # Send the email. The sendmail function requires the sender's email, the list of recipients, and the email message as a string.
-        smtp_server.sendmail(config.EMAIL, user.email, msg.as_string())
-    # Print a message to console after successfully sending the email.
-    print("Message sent!")
+    enqueue_email(
+        session,
+        recipient=user.email,
+        subject="Email verification",
+        body=f"Hello, {user.first_name}\n\nYour verification link is {link_to_send}"
+    )
 
 #####################################
 
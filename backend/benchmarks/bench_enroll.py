@@ -0,0 +1,80 @@
+'''
+Measure per-enrollment cost of enroll_to_course and enroll_users_to_course.
+
+Runs against the database from .env, creates temporary users and removes them afterwards
+(user progress rows are removed by ON DELETE CASCADE).
+
+Usage (from backend directory):
+    python -m benchmarks.bench_enroll --course-id 1 --users 200
+'''
+from database import async_session_maker
+from models import User
+from sqlalchemy import delete, insert
+from user.utils import enroll_to_course, enroll_users_to_course
+from datetime import date
+import argparse
+import asyncio
+import time
+import uuid
+
+
+async def create_users(count: int) -> list[int]:
+    prefix = uuid.uuid4().hex[:8]
+    rows = [
+        {
+            "username": f"bench_{prefix}_{i}",
+            "email": f"bench_{prefix}_{i}@example.com",
+            "phone": f"b{prefix}{i}",
+            "first_name": "Bench",
+            "last_name": "User",
+            "date_of_birth": date(2000, 1, 1),
+            "gender": True,
+            "password_hash": "-",
+        }
+        for i in range(count)
+    ]
+    async with async_session_maker() as session:
+        data = await session.execute(insert(User).returning(User.id), rows)
+        user_ids = data.scalars().all()
+        await session.commit()
+    return user_ids
+
+
+async def drop_users(user_ids: list[int]) -> None:
+    async with async_session_maker() as session:
+        await session.execute(delete(User).filter(User.id.in_(user_ids)))
+        await session.commit()
+
+
+async def bench(course_id: int, users: int) -> None:
+    # one user per request, like the /enroll endpoint
+    user_ids = await create_users(users)
+    try:
+        start = time.perf_counter()
+        async with async_session_maker() as session:
+            for user_id in user_ids:
+                await enroll_to_course(course_id, User(id=user_id), session)
+        elapsed = time.perf_counter() - start
+        print(f"enroll_to_course:        {users} users, {elapsed:.3f}s total, {elapsed / users * 1000:.2f} ms/enrollment")
+    finally:
+        await drop_users(user_ids)
+
+    # whole cohort at once, like the /enroll_many endpoint
+    user_ids = await create_users(users)
+    try:
+        start = time.perf_counter()
+        async with async_session_maker() as session:
+            await enroll_users_to_course(course_id, user_ids, session)
+        elapsed = time.perf_counter() - start
+        print(f"enroll_users_to_course:  {users} users, {elapsed:.3f}s total, {elapsed / users * 1000:.2f} ms/enrollment")
+    finally:
+        await drop_users(user_ids)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--course-id", type=int, required=True)
+    parser.add_argument("--users", type=int, default=100)
+    args = parser.parse_args()
+
+    asyncio.run(bench(args.course_id, args.users))
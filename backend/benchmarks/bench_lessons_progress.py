@@ -0,0 +1,93 @@
+'''
+Compare the old nested-loop progress merge of get_lessons_progress with merge_lesson_progress.
+
+No database is needed: rows shaped like the joined query result are generated in memory
+for chapters of growing size, so the numbers show how each approach scales with chapter size.
+
+Usage (from backend directory):
+    python -m benchmarks.bench_lessons_progress --quizzes 3 --sizes 50 100 200 400 800
+'''
+from collections import namedtuple
+from user.schemas import MyLessons, MyQuizzes
+from user.utils import merge_lesson_progress
+import argparse
+import time
+
+
+Row = namedtuple("Row", [
+    "lesson_id", "lesson_title", "lesson_order", "lesson_description", "is_read",
+    "quiz_id", "quiz_title", "quiz_description", "quiz_completed", "quiz_score"
+])
+UserLesson = namedtuple("UserLesson", ["lesson_id", "is_completed"])
+UserQuiz = namedtuple("UserQuiz", ["quiz_id", "is_completed", "score"])
+
+
+# user has read every other lesson and completed every other quiz
+def make_data(lessons: int, quizzes: int):
+    rows, user_lessons, user_quizzes = [], [], []
+    quiz_id = 0
+    for lesson_id in range(1, lessons + 1):
+        is_read = lesson_id % 2 == 0
+        if is_read:
+            user_lessons.append(UserLesson(lesson_id, True))
+        for _ in range(quizzes):
+            quiz_id += 1
+            completed = quiz_id % 2 == 0
+            if completed:
+                user_quizzes.append(UserQuiz(quiz_id, True, 80.0))
+            rows.append(Row(lesson_id, f"lesson {lesson_id}", lesson_id, "description", is_read,
+                            quiz_id, f"quiz {quiz_id}", "description", completed, 80.0 if completed else 0))
+    return rows, user_lessons, user_quizzes
+
+
+# previous implementation: lessons built first, then progress matched with nested loops
+def nested_loop_merge(rows, user_lessons, user_quizzes) -> list[MyLessons]:
+    lessons = []
+    for row in rows:
+        if not lessons or lessons[-1].id != row.lesson_id:
+            lessons.append(MyLessons(id=row.lesson_id, title=row.lesson_title, order=row.lesson_order,
+                                     description=row.lesson_description, quizzes=[]))
+        lessons[-1].quizzes.append(MyQuizzes(id=row.quiz_id, title=row.quiz_title, description=row.quiz_description))
+
+    for lesson in user_lessons:
+        for i in range(len(lessons)):
+            if lesson.lesson_id == lessons[i].id:
+                lessons[i].is_read = lesson.is_completed
+
+    for quiz in user_quizzes:
+        for i in range(len(lessons)):
+            for j in range(len(lessons[i].quizzes)):
+                if quiz.quiz_id == lessons[i].quizzes[j].id:
+                    lessons[i].quizzes[j].is_completed = quiz.is_completed
+                    lessons[i].quizzes[j].score = quiz.score
+
+    return lessons
+
+
+def best_of(repeat: int, func, *args) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main(args) -> None:
+    print(f"{'lessons':>8} {'quizzes':>8} {'nested ms':>10} {'merge ms':>10} {'merge us/row':>13}")
+    for size in args.sizes:
+        rows, user_lessons, user_quizzes = make_data(size, args.quizzes)
+        assert nested_loop_merge(rows, user_lessons, user_quizzes) == merge_lesson_progress(rows)
+
+        nested = best_of(args.repeat, nested_loop_merge, rows, user_lessons, user_quizzes)
+        merged = best_of(args.repeat, merge_lesson_progress, rows)
+        print(f"{size:>8} {size * args.quizzes:>8} {nested * 1000:>10.2f} {merged * 1000:>10.2f} "
+              f"{merged / len(rows) * 1e6:>13.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quizzes", type=int, default=3, help="quizzes per lesson")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 100, 200, 400, 800], help="lessons per chapter")
+    parser.add_argument("--repeat", type=int, default=5)
+    main(parser.parse_args())
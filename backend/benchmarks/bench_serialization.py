@@ -0,0 +1,90 @@
+'''
+Compare response rendering of the largest payloads: FastAPI's default path
+(jsonable_encoder + JSONResponse) against utils.envelope (pydantic-core straight to bytes).
+
+No database is needed, payloads are built in memory.
+
+Usage (from backend directory):
+    python -m benchmarks.bench_serialization --lessons 500 --quizzes 5 --courses 2000 --comments 100
+'''
+from datetime import datetime
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from guest.schemas import BaseCourse
+from user.schemas import MyLessons, MyQuizzes, MyLesson, MyLessonMaterials, Comment, CommentUser
+from utils import envelope
+import argparse
+import json
+import time
+
+
+def make_lessons(lessons: int, quizzes: int) -> list[MyLessons]:
+    return [
+        MyLessons(id=i, title=f"Lesson {i}", order=i, description="Lesson description " * 5, is_read=i % 2 == 0,
+                  quizzes=[MyQuizzes(id=i * quizzes + j, title=f"Quiz {j}", description="Quiz description",
+                                     is_completed=j % 2 == 0, score=75.5) for j in range(quizzes)])
+        for i in range(lessons)
+    ]
+
+
+def make_courses(courses: int) -> list[BaseCourse]:
+    return [BaseCourse(id=i, title=f"Course {i}", description="Course description " * 10) for i in range(courses)]
+
+
+def make_lesson(materials: int, comments: int) -> MyLesson:
+    return MyLesson(
+        id=1, title="Lesson", description="Lesson description",
+        materials=[MyLessonMaterials(material_type="text", material_content="Material " * 50, order=i)
+                   for i in range(materials)],
+        comments=[Comment(id=i, content="Comment text " * 10, created_at=datetime(2026, 1, 1, 12, 0, i % 60),
+                          user=CommentUser(id=i, username=f"user{i}", first_name="First", last_name="Last",
+                                           profile_picture=None)) for i in range(comments)],
+        comment_count=comments
+    )
+
+
+def render_default(message: str, data) -> bytes:
+    content = {"details": {"success": True, "message": message, "data": data}}
+    return JSONResponse(jsonable_encoder(content)).body
+
+
+def render_envelope(message: str, data) -> bytes:
+    return envelope(message, data).body
+
+
+def best_of(repeat: int, func, *args) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main(args) -> None:
+    payloads = [
+        ("lessons", make_lessons(args.lessons, args.quizzes)),
+        ("guest_courses", make_courses(args.courses)),
+        ("lesson", make_lesson(args.materials, args.comments)),
+    ]
+
+    print(f"{'payload':15} {'kB':>8} {'default ms':>11} {'envelope ms':>12} {'speedup':>8}")
+    for name, data in payloads:
+        # both paths must produce the same document
+        assert json.loads(render_default(name, data)) == json.loads(render_envelope(name, data))
+
+        default = best_of(args.repeat, render_default, name, data)
+        fast = best_of(args.repeat, render_envelope, name, data)
+        size = len(render_envelope(name, data)) / 1024
+        print(f"{name:15} {size:>8.1f} {default * 1000:>11.2f} {fast * 1000:>12.2f} {default / fast:>7.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lessons", type=int, default=500)
+    parser.add_argument("--quizzes", type=int, default=5, help="quizzes per lesson")
+    parser.add_argument("--courses", type=int, default=2000)
+    parser.add_argument("--materials", type=int, default=20)
+    parser.add_argument("--comments", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=20)
+    main(parser.parse_args())
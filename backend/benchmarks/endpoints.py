@@ -0,0 +1,206 @@
+'''
+Endpoint benchmark harness.
+
+Runs the FastAPI app in-process through an ASGI client against the database from .env
+and reports throughput, latency percentiles and SQL queries per request for each endpoint.
+Point DATABASE at a dedicated benchmark database: --reset drops and recreates every table.
+
+Usage (from backend directory):
+    python -m benchmarks.endpoints run --reset --scale 1 --output base.json
+    python -m benchmarks.endpoints run --requests 500 --concurrency 20 --output new.json
+    python -m benchmarks.endpoints compare base.json new.json
+'''
+from dataclasses import dataclass, asdict
+from sqlalchemy import select
+from database import engine, replica_router, Base, async_session_maker
+from instrumentation import instrument_engine
+from config import config
+from models import User, UserCourse, Chapter, Lesson
+from populate_db import GeneratorSettings, populate
+from app import app
+import argparse
+import asyncio
+import json
+import statistics
+import time
+import httpx
+
+
+# per request SQL statistics are read from X-DB-* headers of instrumentation.QueryStatsMiddleware,
+# engines were created before this flag was set, so their listeners are registered here
+config.DB_QUERY_DEBUG = True
+for db_engine in [engine] + [replica.engine for replica in replica_router.replicas]:
+    instrument_engine(db_engine, debug=True)
+
+
+@dataclass
+class EndpointResult:
+    name: str
+    requests: int
+    errors: int
+    throughput: float  # requests per second
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    queries_per_request: float
+    db_ms_per_request: float
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def reset_database(settings: GeneratorSettings) -> None:
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.drop_all)
+        await connection.run_sync(Base.metadata.create_all)
+    await populate(settings)
+
+
+async def pick_targets() -> dict:
+    # a user with at least one enrollment and ids from that course
+    async with async_session_maker() as session:
+        data = await session.execute(
+            select(User.username, UserCourse.course_id).join(UserCourse, UserCourse.user_id == User.id).limit(1))
+        username, course_id = data.one()
+        data = await session.execute(
+            select(Chapter.id, Lesson.id).join(Lesson, Lesson.chapter_id == Chapter.id).filter(
+                Chapter.course_id == course_id).order_by(Chapter.id, Lesson.id).limit(1))
+        chapter_id, lesson_id = data.one()
+    return {"username": username, "course_id": course_id, "chapter_id": chapter_id, "lesson_id": lesson_id}
+
+
+async def measure(client: httpx.AsyncClient, name: str, method: str, url: str, requests: int,
+                  concurrency: int, json_body: dict | None = None) -> EndpointResult:
+    latencies, queries, db_times = [], [], []
+    errors = 0
+    remaining = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            start = time.perf_counter()
+            response = await client.request(method, url, json=json_body)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+            queries.append(int(response.headers.get("x-db-query-count", 0)))
+            db_times.append(float(response.headers.get("x-db-time-ms", 0)))
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+
+    return EndpointResult(
+        name=name,
+        requests=requests,
+        errors=errors,
+        throughput=requests / elapsed if elapsed else 0.0,
+        p50_ms=percentile(latencies, 50),
+        p95_ms=percentile(latencies, 95),
+        p99_ms=percentile(latencies, 99),
+        queries_per_request=statistics.fmean(queries) if queries else 0.0,
+        db_ms_per_request=statistics.fmean(db_times) if db_times else 0.0
+    )
+
+
+async def run(args) -> list[EndpointResult]:
+    settings = GeneratorSettings(scale=args.scale, seed=args.seed, password=args.password)
+    if args.reset:
+        await reset_database(settings)
+
+    targets = await pick_targets()
+    credentials = {"username": targets["username"], "password": args.password}
+
+    # https base url, auth cookies are marked secure
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="https://bench") as client:
+        response = await client.post("/api/auth/sign_in", json=credentials)
+        response.raise_for_status()
+
+        endpoints = [
+            ("sign_in", "POST", "/api/auth/sign_in", credentials),
+            ("guest_courses", "GET", "/api/guest/courses", None),
+            ("courses", "GET", "/api/user/courses", None),
+            ("my_courses", "GET", "/api/user/my_courses", None),
+            ("chapters", "GET", f"/api/user/chapters/{targets['course_id']}", None),
+            ("lessons", "GET", f"/api/user/lessons/{targets['chapter_id']}", None),
+            ("lesson", "GET", f"/api/user/lesson/{targets['lesson_id']}", None),
+            ("enroll", "POST", f"/api/user/enroll/{targets['course_id']}", None),
+        ]
+
+        results = []
+        for name, method, url, body in endpoints:
+            if args.only and name not in args.only:
+                continue
+            # sign_in is bcrypt bound, keep it short
+            requests = min(args.requests, 50) if name == "sign_in" else args.requests
+            await measure(client, name, method, url, min(requests, args.warmup), args.concurrency, body)
+            results.append(await measure(client, name, method, url, requests, args.concurrency, body))
+
+    await engine.dispose()
+    return results
+
+
+def print_results(results: list[EndpointResult]) -> None:
+    print(f"{'endpoint':15} {'req':>6} {'err':>5} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+          f"{'queries':>8} {'db ms':>8}")
+    for result in results:
+        print(f"{result.name:15} {result.requests:>6} {result.errors:>5} {result.throughput:>9.1f} "
+              f"{result.p50_ms:>9.2f} {result.p95_ms:>9.2f} {result.p99_ms:>9.2f} "
+              f"{result.queries_per_request:>8.1f} {result.db_ms_per_request:>8.2f}")
+
+
+def compare(base_path: str, new_path: str) -> None:
+    with open(base_path) as file:
+        base = {result["name"]: result for result in json.load(file)}
+    with open(new_path) as file:
+        new = {result["name"]: result for result in json.load(file)}
+
+    def delta(old: float, current: float) -> str:
+        return f"{(current - old) / old * 100:+.1f}%" if old else "n/a"
+
+    print(f"{'endpoint':15} {'req/s':>9} {'p50':>9} {'p95':>9} {'p99':>9} {'queries':>12}")
+    for name, result in new.items():
+        if name not in base:
+            continue
+        old = base[name]
+        print(f"{name:15} {delta(old['throughput'], result['throughput']):>9} "
+              f"{delta(old['p50_ms'], result['p50_ms']):>9} {delta(old['p95_ms'], result['p95_ms']):>9} "
+              f"{delta(old['p99_ms'], result['p99_ms']):>9} "
+              f"{old['queries_per_request']:>5.1f} -> {result['queries_per_request']:<5.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="benchmark endpoints")
+    run_parser.add_argument("--reset", action="store_true", help="drop all tables and seed fresh data")
+    run_parser.add_argument("--scale", type=int, default=1, help="data generator scale used with --reset")
+    run_parser.add_argument("--seed", type=int, default=42)
+    run_parser.add_argument("--password", default="password", help="password of generated users")
+    run_parser.add_argument("--requests", type=int, default=200, help="requests per endpoint")
+    run_parser.add_argument("--concurrency", type=int, default=10)
+    run_parser.add_argument("--warmup", type=int, default=20, help="requests per endpoint before measuring")
+    run_parser.add_argument("--only", nargs="*", help="endpoint names to run")
+    run_parser.add_argument("--output", help="save results as json for compare")
+
+    compare_parser = commands.add_parser("compare", help="compare two saved runs")
+    compare_parser.add_argument("base")
+    compare_parser.add_argument("new")
+
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        compare(args.base, args.new)
+    else:
+        results = asyncio.run(run(args))
+        print_results(results)
+        if args.output:
+            with open(args.output, "w") as file:
+                json.dump([asdict(result) for result in results], file, indent=2)
@@ -0,0 +1,181 @@
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+from pydantic import TypeAdapter
+import asyncio
+import logging
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    In-process LRU cache where every entry expires after ttl seconds.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                return default
+
+            expires_at, value = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None) -> None:
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            # drop least recently used entries
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, *keys: Hashable) -> None:
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    # snapshot of (key, value) pairs, expired entries included
+    def items(self) -> list[tuple[Hashable, Any]]:
+        with self._lock:
+            return [(key, value) for key, (_, value) in self._data.items()]
+
+    # membership without touching recency, expired entries included
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class CacheBackend(ABC):
+    """
+    Shared cache backend (e.g. redis or memcached) placed behind the in-process cache.
+    Values are serialized JSON bytes so any process can read them.
+    Calls are awaited, so network backends do not block the event loop.
+    """
+
+    @abstractmethod
+    async def get(self, key: str) -> bytes | None:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        ...
+
+    @abstractmethod
+    async def delete(self, *keys: str) -> None:
+        ...
+
+
+class LocalCacheBackend(CacheBackend):
+    """
+    Local stand-in for a shared backend, used in development and tests.
+    """
+
+    def __init__(self, maxsize: int = 4096):
+        self._cache = TTLCache(maxsize=maxsize)
+
+    async def get(self, key: str) -> bytes | None:
+        return self._cache.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        self._cache.set(key, value, ttl)
+
+    async def delete(self, *keys: str) -> None:
+        self._cache.delete(*keys)
+
+
+class ReadThroughCache:
+    """
+    Two level read-through cache: in-process TTLCache first, then optional shared backend,
+    then the loader (database). Invalidation drops the key on both levels.
+
+    Invalidations only reach the in-process level of this worker, so with a shared backend
+    the in-process level keeps entries for local_ttl seconds and other workers pick up
+    invalidated keys from the backend shortly after.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float = 300.0, backend: CacheBackend | None = None,
+                 local_ttl: float | None = None):
+        self.ttl = ttl
+        self.local = TTLCache(maxsize=maxsize, ttl=ttl if backend is None or local_ttl is None else min(local_ttl, ttl))
+        self.backend = backend
+        # bumped on every invalidation, so a load that raced with a write is not stored
+        self._generation = 0
+        # keys whose backend delete has not finished yet, they are not read from the backend
+        self._deleting: dict[str, int] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[Any]], adapter: TypeAdapter) -> Any:
+        value = self.local.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        generation = self._generation
+        if self.backend is not None and key not in self._deleting:
+            raw = await self.backend.get(key)
+            if raw is not None:
+                value = adapter.validate_json(raw)
+                if generation == self._generation:
+                    self.local.set(key, value)
+                return value
+
+        value = await loader()
+
+        if generation == self._generation:
+            self.local.set(key, value)
+            if self.backend is not None:
+                await self.backend.set(key, adapter.dump_json(value), self.ttl)
+        return value
+
+    # called from sync ORM events, the backend delete runs as a task on the running loop,
+    # or to completion right away when there is no loop (scripts, data migrations, sync sessions)
+    def invalidate(self, *keys: str) -> None:
+        self._generation += 1
+        self.local.delete(*keys)
+        if self.backend is not None and keys:
+            for key in keys:
+                self._deleting[key] = self._deleting.get(key, 0) + 1
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                asyncio.run(self._delete_shared(keys))
+                return
+            task = loop.create_task(self._delete_shared(keys))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _delete_shared(self, keys: tuple[str, ...]) -> None:
+        try:
+            await self.backend.delete(*keys)
+        except Exception:
+            logger.exception("Failed to delete %d keys from the shared cache backend", len(keys))
+        finally:
+            for key in keys:
+                if self._deleting[key] == 1:
+                    del self._deleting[key]
+                else:
+                    self._deleting[key] -= 1
@@ -15,27 +15,119 @@ class Config:
     PORT = os.getenv('PORT')
     DATABASE = os.getenv('DATABASE')
 
+    # Database engine / connection pool (sized per worker process)
+    DB_ECHO = os.getenv('DB_ECHO', 'false').lower() == 'true'
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 10))
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 30))  # seconds to wait for a free connection
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))  # seconds, -1 to disable
+    DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
+    DB_CONNECT_TIMEOUT = float(os.getenv('DB_CONNECT_TIMEOUT', 10))
+    DB_STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', 0))  # 0 - no timeout
+    DB_PREPARED_STATEMENT_CACHE_SIZE = int(os.getenv('DB_PREPARED_STATEMENT_CACHE_SIZE', 100))  # asyncpg, 0 to disable
+
+    # Per-request SQL statistics (dev mode: X-DB-* response headers and N+1 warnings)
+    DB_QUERY_DEBUG = os.getenv('DB_QUERY_DEBUG', 'false').lower() == 'true'
+    DB_QUERY_REPEAT_THRESHOLD = int(os.getenv('DB_QUERY_REPEAT_THRESHOLD', 5))  # same statement N times per request -> N+1 warning
+
+    # Prometheus metrics endpoint (/metrics), off by default
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'false').lower() == 'true'
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')  # scrapers send "Authorization: Bearer <token>", '' - no check (internal-only bind)
+
+    # Read replicas (comma separated host:port list, same credentials and database as primary)
+    DB_REPLICA_HOSTS = [host.strip() for host in os.getenv('DB_REPLICA_HOSTS', '').split(',') if host.strip()]
+    DB_REPLICA_MAX_LAG = float(os.getenv('DB_REPLICA_MAX_LAG', 5))  # seconds, lagging replicas are skipped
+    DB_REPLICA_CHECK_INTERVAL = float(os.getenv('DB_REPLICA_CHECK_INTERVAL', 5))  # seconds between lag checks
+
     # JWT token configuration
     JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY')
     JWT_ALGORITHM = os.getenv('JWT_ALGORITHM')
     JWT_EXPIRATION_TIME = int(os.getenv('JWT_EXPIRATION_TIME'))
     JWT_REFRESH_EXPIRATION_TIME = int(os.getenv('JWT_REFRESH_EXPIRATION_TIME'))
 
+    # Auth fast path caches
+    TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 10000))  # verified token -> claims
+    USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', 10000))  # username -> user principal
+    USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', 30))  # seconds
+    TOKEN_REFRESH_GRACE_SECONDS = float(os.getenv('TOKEN_REFRESH_GRACE_SECONDS', 10))  # reuse of a minted pair for the same refresh token
+
+    # Password hashing (bcrypt runs in a bounded thread pool)
+    BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', 12))
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', min(4, os.cpu_count() or 1)))
+    PASSWORD_HASH_MAX_PENDING = int(os.getenv('PASSWORD_HASH_MAX_PENDING', 64))
+
     # For email verification
     EMAIL_VERIFICATION_SECRET_KEY = os.getenv('EMAIL_VERIFICATION_SECRET_KEY')
     EMAIL_PASS = os.getenv("EMAIL_PASS")
     EMAIL = os.getenv("EMAIL")
     EMAIL_SMTP_SERVER = os.getenv("EMAIL_SMTP_SERVER")
     EMAIL_SMTP_SERVER_PORT = int(os.getenv("EMAIL_SMTP_SERVER_PORT"))
+    EMAIL_SMTP_USE_TLS = os.getenv("EMAIL_SMTP_USE_TLS", "true").lower() == "true"  # implicit TLS (SMTPS)
+    EMAIL_SMTP_IDLE_TIMEOUT = float(os.getenv("EMAIL_SMTP_IDLE_TIMEOUT", 60))  # close pooled connection after idle seconds
+
+    # Email dispatcher (mailer.dispatcher)
+    EMAIL_DISPATCHER_ENABLED = os.getenv("EMAIL_DISPATCHER_ENABLED", "true").lower() == "true"
+    EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", 50))
+    EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", 5))
+    EMAIL_RETRY_BASE_SECONDS = float(os.getenv("EMAIL_RETRY_BASE_SECONDS", 30))
+    EMAIL_POLL_INTERVAL = float(os.getenv("EMAIL_POLL_INTERVAL", 5))
+    EMAIL_SEND_LEASE_SECONDS = float(os.getenv("EMAIL_SEND_LEASE_SECONDS", 300))  # claimed rows are re-claimed after this if the worker died
 
     # Web App Domain name for urls
     WEB_APP_DOMAIN = os.getenv('WEP_APP_DOMAIN')
 
-    def get_db_url(self):
+    # Write-behind lesson view recording (user.progress)
+    LESSON_VIEW_FLUSH_INTERVAL = float(os.getenv('LESSON_VIEW_FLUSH_INTERVAL', 2))  # seconds
+    LESSON_VIEW_FLUSH_SIZE = int(os.getenv('LESSON_VIEW_FLUSH_SIZE', 500))  # flush early at this many pending views, also batch size
+
+    # Lesson/quiz comments (keyset pagination)
+    COMMENTS_PAGE_SIZE = int(os.getenv('COMMENTS_PAGE_SIZE', 20))
+    COMMENTS_MAX_PAGE_SIZE = int(os.getenv('COMMENTS_MAX_PAGE_SIZE', 100))
+
+    # XP and leaderboards (in-memory rank index per board, rebuilt from the database when stale)
+    XP_PER_LEVEL = int(os.getenv('XP_PER_LEVEL', 1000))
+    XP_LESSON_COMPLETED = int(os.getenv('XP_LESSON_COMPLETED', 10))
+    XP_CHAPTER_COMPLETED = int(os.getenv('XP_CHAPTER_COMPLETED', 50))
+    XP_COURSE_COMPLETED = int(os.getenv('XP_COURSE_COMPLETED', 200))
+    LEADERBOARD_REFRESH_SECONDS = float(os.getenv('LEADERBOARD_REFRESH_SECONDS', 600))  # full rebuild interval, corrects drift between workers
+    LEADERBOARD_MAX_BOARDS = int(os.getenv('LEADERBOARD_MAX_BOARDS', 64))  # global + weekly + most recently used course boards
+    LEADERBOARD_PAGE_SIZE = int(os.getenv('LEADERBOARD_PAGE_SIZE', 50))
+    LEADERBOARD_MAX_PAGE_SIZE = int(os.getenv('LEADERBOARD_MAX_PAGE_SIZE', 200))
+
+    # Achievements (rules are cached per worker, counters live in user_achievement_counters)
+    ACHIEVEMENT_RULES_TTL = float(os.getenv('ACHIEVEMENT_RULES_TTL', 300))  # seconds, picks up rules edited by other workers
+
+    # Quizzes (compiled answer keys are cached per worker and dropped on edits)
+    QUIZ_PASS_SCORE = float(os.getenv('QUIZ_PASS_SCORE', 70))  # percent of correct answers to complete a quiz
+    XP_QUIZ_COMPLETED = int(os.getenv('XP_QUIZ_COMPLETED', 30))
+    QUIZ_CACHE_SIZE = int(os.getenv('QUIZ_CACHE_SIZE', 2048))  # quizzes
+    QUIZ_CACHE_TTL = float(os.getenv('QUIZ_CACHE_TTL', 300))  # seconds, picks up edits made by other workers
+    QUIZ_MAX_BATCH = int(os.getenv('QUIZ_MAX_BATCH', 50))  # submissions graded in one request
+    QUIZ_MAX_LIVES = int(os.getenv('QUIZ_MAX_LIVES', 3))  # a failed submission spends a life
+    QUIZ_LIFE_REGEN_MINUTES = float(os.getenv('QUIZ_LIFE_REGEN_MINUTES', 30))  # one life regenerates per period
+
+    # Public course/chapter catalog cache
+    CATALOG_CACHE_TTL = float(os.getenv('CATALOG_CACHE_TTL', 300))
+    CATALOG_CACHE_SIZE = int(os.getenv('CATALOG_CACHE_SIZE', 1024))
+    CATALOG_CACHE_BACKEND = os.getenv('CATALOG_CACHE_BACKEND', '')  # '' for in-process only, 'local' for local shared stand-in
+    CATALOG_CACHE_LOCAL_TTL = float(os.getenv('CATALOG_CACHE_LOCAL_TTL', 5))  # seconds, in-process level when a shared backend is set
+
+    def get_db_url(self, host: str | None = None, port: str | None = None):
         """
         Construct the database URL from the configuration.
+        Host and port can be overridden to point at a replica.
+        """
+        return f"postgresql+asyncpg://{self.USER}:{self.PASSWORD}@{host or self.HOST}:{port or self.PORT}/{self.DATABASE}"
+
+    def get_replica_urls(self):
+        """
+        Construct database URLs of read replicas.
         """
-        return f"postgresql+asyncpg://{self.USER}:{self.PASSWORD}@{self.HOST}:{self.PORT}/{self.DATABASE}"
+        urls = []
+        for replica in self.DB_REPLICA_HOSTS:
+            host, _, port = replica.partition(":")
+            urls.append(self.get_db_url(host=host, port=port or None))
+        return urls
 
 
 config = Config()
@@ -1,17 +1,206 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, AsyncAttrs
-from sqlalchemy import func
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, AsyncAttrs, AsyncEngine
+from sqlalchemy import func, make_url, text
+from sqlalchemy.exc import SQLAlchemyError, TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from sqlalchemy.orm import sessionmaker, DeclarativeBase, Mapped, mapped_column
 from typing import AsyncGenerator, Annotated
 from fastapi import Depends
 from datetime import datetime
+import asyncio
+import time
 
-from config import config
+from config import config, Config
+from instrumentation import instrument_engine
+from metrics import Gauge, Counter, register_collector
 
 
-engine = create_async_engine(config.get_db_url(), echo=True)
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long callers wait for a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_count = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.timeouts = 0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            self.wait_count += 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+
+# create engine with pool settings from config
+def create_engine_from_config(settings: Config, url: str | None = None) -> AsyncEngine:
+    db_url = make_url(url or settings.get_db_url()).update_query_dict({
+        "prepared_statement_cache_size": str(settings.DB_PREPARED_STATEMENT_CACHE_SIZE)
+    })
+
+    connect_args = {"timeout": settings.DB_CONNECT_TIMEOUT}
+    if settings.DB_STATEMENT_TIMEOUT_MS:
+        connect_args["server_settings"] = {"statement_timeout": str(settings.DB_STATEMENT_TIMEOUT_MS)}
+
+    db_engine = create_async_engine(
+        db_url,
+        echo=settings.DB_ECHO,
+        poolclass=InstrumentedQueuePool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        connect_args=connect_args
+    )
+    instrument_engine(db_engine)
+    return db_engine
+
+
+# pool usage of an engine (checked-out, overflow, wait time)
+def get_pool_stats(db_engine: AsyncEngine | None = None) -> dict:
+    pool = (db_engine or engine).pool
+    stats = {
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+        "max_overflow": pool._max_overflow,
+    }
+    if isinstance(pool, InstrumentedQueuePool):
+        stats.update({
+            "wait_count": pool.wait_count,
+            "wait_seconds_total": pool.wait_seconds_total,
+            "wait_seconds_max": pool.wait_seconds_max,
+            "timeouts": pool.timeouts,
+        })
+    return stats
+
+
+engine = create_engine_from_config(config)
 async_session_maker = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
 
+# replication lag in seconds, 0 when replica has replayed everything it received (or is a primary)
+REPLICA_LAG_QUERY = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+
+class Replica:
+    def __init__(self, db_engine: AsyncEngine):
+        self.engine = db_engine
+        self.session_maker = sessionmaker(db_engine, class_=AsyncSession, expire_on_commit=False)
+        self.lag: float | None = None  # None - unknown or unreachable
+        self.checked_at = 0.0
+        self.checking = False
+
+
+class ReplicaRouter:
+    '''
+    Picks a session maker for read-only work.
+    Replicas are used round-robin while their lag is below max_lag, otherwise reads go to the primary.
+    Lag is re-checked in the background every check_interval seconds, requests never wait for it.
+    '''
+
+    def __init__(self, primary: sessionmaker, replicas: list[AsyncEngine], max_lag: float, check_interval: float):
+        self.primary = primary
+        self.replicas = [Replica(replica_engine) for replica_engine in replicas]
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._next = 0
+        self._tasks = set()
+
+    async def check(self, replica: Replica) -> None:
+        try:
+            async with replica.engine.connect() as connection:
+                result = await asyncio.wait_for(connection.execute(REPLICA_LAG_QUERY), timeout=self.check_interval)
+                replica.lag = float(result.scalar())
+        except (SQLAlchemyError, OSError, asyncio.TimeoutError):
+            replica.lag = None
+        finally:
+            replica.checked_at = time.monotonic()
+            replica.checking = False
+
+    def _schedule_checks(self) -> None:
+        now = time.monotonic()
+        for replica in self.replicas:
+            if not replica.checking and now - replica.checked_at >= self.check_interval:
+                replica.checking = True
+                task = asyncio.create_task(self.check(replica))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+    def get_session_maker(self) -> sessionmaker:
+        if not self.replicas:
+            return self.primary
+
+        self._schedule_checks()
+
+        healthy = [replica for replica in self.replicas if replica.lag is not None and replica.lag <= self.max_lag]
+        if not healthy:
+            return self.primary
+
+        self._next = (self._next + 1) % len(healthy)
+        return healthy[self._next].session_maker
+
+    def stats(self) -> list[dict]:
+        return [
+            {"url": replica.engine.url.render_as_string(hide_password=True), "lag": replica.lag}
+            for replica in self.replicas
+        ]
+
+
+replica_router = ReplicaRouter(
+    primary=async_session_maker,
+    replicas=[create_engine_from_config(config, url) for url in config.get_replica_urls()],
+    max_lag=config.DB_REPLICA_MAX_LAG,
+    check_interval=config.DB_REPLICA_CHECK_INTERVAL
+)
+
+
+db_pool_connections = Gauge("db_pool_connections", "Connections of the pool by state.", ("database", "state"))
+db_pool_saturation = Gauge("db_pool_saturation", "Checked-out connections / (pool_size + max_overflow).", ("database",))
+db_pool_wait_max = Gauge("db_pool_checkout_wait_max_seconds", "Longest wait for a connection since start.", ("database",))
+db_pool_waits = Counter("db_pool_checkouts_total", "Connection checkouts.", ("database",))
+db_pool_wait_seconds = Counter("db_pool_checkout_wait_seconds_total", "Time spent waiting for a connection.", ("database",))
+db_pool_timeouts = Counter("db_pool_checkout_timeouts_total", "Checkouts that timed out waiting for a connection.", ("database",))
+
+
+def collect_pool_metrics() -> None:
+    engines = [("primary", engine)] + [
+        (replica.engine.url.render_as_string(hide_password=True).rsplit("@", 1)[-1], replica.engine)
+        for replica in replica_router.replicas
+    ]
+    for name, db_engine in engines:
+        if not isinstance(db_engine.pool, AsyncAdaptedQueuePool):
+            continue
+        stats = get_pool_stats(db_engine)
+        db_pool_connections.set(stats["checked_out"], name, "checked_out")
+        db_pool_connections.set(stats["checked_in"], name, "checked_in")
+        db_pool_connections.set(stats["overflow"], name, "overflow")
+        capacity = stats["size"] + max(stats["max_overflow"], 0)
+        db_pool_saturation.set(stats["checked_out"] / capacity if capacity else 0.0, name)
+        if "wait_count" in stats:
+            db_pool_wait_max.set(stats["wait_seconds_max"], name)
+            db_pool_waits.set_total(stats["wait_count"], name)
+            db_pool_wait_seconds.set_total(stats["wait_seconds_total"], name)
+            db_pool_timeouts.set_total(stats["timeouts"], name)
+
+
+register_collector(collect_pool_metrics)
+
+
 class Base(AsyncAttrs, DeclarativeBase):
     created_at: Mapped[datetime] = mapped_column(server_default=func.now())
     updated_at: Mapped[datetime] = mapped_column(server_default=func.now(), onupdate=func.now())
@@ -23,3 +212,11 @@ async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
         yield session
 
 SessionDep = Annotated[AsyncSession, Depends(get_async_session)]
+
+
+# Dependency -> session for read-only endpoints (replica when available, primary otherwise)
+async def get_read_session() -> AsyncGenerator[AsyncSession, None]:
+    async with replica_router.get_session_maker()() as session:
+        yield session
+
+ReadSessionDep = Annotated[AsyncSession, Depends(get_read_session)]
@@ -1,12 +1,7 @@
-from fastapi import APIRouter, HTTPException, status
-from database import SessionDep
-from models import Course, Chapter
-from guest.schemas import BaseChapter, BaseCourse
-from sqlalchemy import select
-from sqlalchemy.orm import selectinload
-from typing import List
-from sqlalchemy.exc import SQLAlchemyError
-from utils import internal_error
+from fastapi import APIRouter
+from database import ReadSessionDep
+from guest.utils import get_cached_courses, get_cached_chapters
+from utils import envelope
 
 router = APIRouter(
     prefix="/guest",
@@ -15,39 +10,11 @@ router = APIRouter(
 
 
 @router.get("/courses")
-async def get_courses(session: SessionDep):
-    statement = select(Course)
-    try:
-        data = await session.execute(statement)
-        courses = data.scalars().all()
-        
-        base_courses = [BaseCourse.model_validate(course) for course in courses]
-        return {
-            "details": {
-                "success": True,
-                "message": "List of courses available",
-                "data": base_courses
-            }
-        }
-    
-    except SQLAlchemyError:
-        raise internal_error
+async def get_courses(session: ReadSessionDep):
+    base_courses = await get_cached_courses(session)
+    return envelope("List of courses available", base_courses)
 
 @router.get("/chapters/{course_id}")
-async def get_course_chapters(course_id: int, session: SessionDep):
-    statement = select(Chapter).filter(Chapter.course_id == course_id)
-
-    try:
-        data = await session.execute(statement)
-        chapters = data.scalars().all()
-
-        base_chapters = [BaseChapter.model_validate(chapter) for chapter in chapters]
-        return {
-            "details": {
-                "success": True,
-                "message": f"List of chapters available for course with id:{course_id}",
-                "data": base_chapters
-            }
-        } 
-    except SQLAlchemyError:
-        raise internal_error
\ No newline at end of file
+async def get_course_chapters(course_id: int, session: ReadSessionDep):
+    base_chapters = await get_cached_chapters(course_id, session)
+    return envelope(f"List of chapters available for course with id:{course_id}", base_chapters)
@@ -0,0 +1,81 @@
+from models import Course, Chapter
+from sqlalchemy import select, event, inspect
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from pydantic import TypeAdapter
+from typing import List
+from guest.schemas import BaseCourse, BaseChapter
+from database import SessionDep
+from cache import ReadThroughCache, LocalCacheBackend
+from utils import internal_error
+from config import config
+
+
+catalog_cache = ReadThroughCache(
+    maxsize=config.CATALOG_CACHE_SIZE,
+    ttl=config.CATALOG_CACHE_TTL,
+    backend=LocalCacheBackend() if config.CATALOG_CACHE_BACKEND == "local" else None,
+    local_ttl=config.CATALOG_CACHE_LOCAL_TTL
+)
+
+courses_adapter = TypeAdapter(List[BaseCourse])
+chapters_adapter = TypeAdapter(List[BaseChapter])
+
+COURSES_KEY = "catalog:courses"
+
+
+def chapters_key(course_id: int) -> str:
+    return f"catalog:chapters:{course_id}"
+
+
+# load list of all courses (served from catalog cache when warm)
+async def get_cached_courses(session: SessionDep) -> List[BaseCourse]:
+    async def load() -> List[BaseCourse]:
+        try:
+            data = await session.execute(select(Course))
+            return [BaseCourse.model_validate(course) for course in data.scalars().all()]
+        except SQLAlchemyError:
+            raise internal_error
+
+    return await catalog_cache.get_or_load(COURSES_KEY, load, courses_adapter)
+
+
+# load list of chapters of a course (served from catalog cache when warm)
+async def get_cached_chapters(course_id: int, session: SessionDep) -> List[BaseChapter]:
+    async def load() -> List[BaseChapter]:
+        try:
+            data = await session.execute(select(Chapter).filter(Chapter.course_id == course_id))
+            return [BaseChapter.model_validate(chapter) for chapter in data.scalars().all()]
+        except SQLAlchemyError:
+            raise internal_error
+
+    return await catalog_cache.get_or_load(chapters_key(course_id), load, chapters_adapter)
+
+
+######## CACHE INVALIDATION ON ORM WRITES #########
+# collect catalog keys touched by the flush, drop them once the transaction is committed
+@event.listens_for(Session, "after_flush")
+def collect_catalog_keys(session, flush_context):
+    keys = session.info.setdefault("catalog_keys", set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, Course):
+            keys.add(COURSES_KEY)
+            keys.add(chapters_key(obj.id))
+        elif isinstance(obj, Chapter):
+            keys.add(chapters_key(obj.course_id))
+            # chapter moved to another course
+            for old_course_id in inspect(obj).attrs.course_id.history.deleted:
+                keys.add(chapters_key(old_course_id))
+
+
+@event.listens_for(Session, "after_commit")
+def invalidate_catalog_keys(session):
+    keys = session.info.pop("catalog_keys", None)
+    if keys:
+        catalog_cache.invalidate(*keys)
+
+
+@event.listens_for(Session, "after_rollback")
+def discard_catalog_keys(session):
+    session.info.pop("catalog_keys", None)
+###################################################
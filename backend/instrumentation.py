@@ -0,0 +1,113 @@
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from config import config
+import logging
+import re
+import time
+
+
+logger = logging.getLogger(__name__)
+
+# collapse bound parameter lists so "IN ($1, $2)" and "IN ($1, $2, $3)" count as the same statement
+PARAMETERS_PATTERN = re.compile(r"(\$\d+|%\(\w+\)s|\?)(\s*,\s*(\$\d+|%\(\w+\)s|\?))*")
+
+
+@dataclass
+class RequestQueryStats:
+    count: int = 0
+    total_seconds: float = 0.0
+    slowest_seconds: float = 0.0
+    slowest_statement: str | None = None
+    statements: Counter = field(default_factory=Counter)
+
+    def record(self, statement: str, elapsed: float) -> None:
+        self.count += 1
+        self.total_seconds += elapsed
+        if elapsed > self.slowest_seconds:
+            self.slowest_seconds = elapsed
+            self.slowest_statement = statement
+        self.statements[PARAMETERS_PATTERN.sub("?", statement)] += 1
+
+    # statements executed at least threshold times in one request - usually N+1 loading
+    def repeated(self, threshold: int) -> dict[str, int]:
+        return {statement: count for statement, count in self.statements.items() if count >= threshold}
+
+
+# stats of the request being served, None outside of requests
+current_query_stats: ContextVar[RequestQueryStats | None] = ContextVar("current_query_stats", default=None)
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = conn.info["query_start"].pop()
+    stats = current_query_stats.get()
+    if stats is not None:
+        stats.record(statement, time.perf_counter() - start)
+
+
+# statement failed, after_cursor_execute is not called for it
+def handle_error(context):
+    if context.connection is not None:
+        starts = context.connection.info.get("query_start")
+        if starts:
+            starts.pop()
+
+
+# record every statement executed through the engine into current request stats,
+# only in debug mode so production statements are not timed and normalized
+def instrument_engine(db_engine: AsyncEngine, debug: bool | None = None) -> None:
+    if not (config.DB_QUERY_DEBUG if debug is None else debug):
+        return
+    # already instrumented (e.g. debug was on when the engine was created)
+    if event.contains(db_engine.sync_engine, "before_cursor_execute", before_cursor_execute):
+        return
+    event.listen(db_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(db_engine.sync_engine, "after_cursor_execute", after_cursor_execute)
+    event.listen(db_engine.sync_engine, "handle_error", handle_error)
+
+
+class QueryStatsMiddleware:
+    '''
+    ASGI middleware collecting SQL statistics per request.
+    With DB_QUERY_DEBUG enabled the numbers are returned as X-DB-* response headers
+    and repeated statements (possible N+1 loading) are logged, otherwise requests pass through.
+    '''
+
+    def __init__(self, app, debug: bool | None = None, repeat_threshold: int | None = None):
+        self.app = app
+        self.debug = config.DB_QUERY_DEBUG if debug is None else debug
+        self.repeat_threshold = repeat_threshold or config.DB_QUERY_REPEAT_THRESHOLD
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.debug:
+            return await self.app(scope, receive, send)
+
+        stats = RequestQueryStats()
+        token = current_query_stats.set(stats)
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-db-query-count", str(stats.count).encode()))
+                headers.append((b"x-db-time-ms", f"{stats.total_seconds * 1000:.2f}".encode()))
+                headers.append((b"x-db-slowest-ms", f"{stats.slowest_seconds * 1000:.2f}".encode()))
+                repeated = stats.repeated(self.repeat_threshold)
+                if repeated:
+                    headers.append((b"x-db-repeated-statements", str(len(repeated)).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            current_query_stats.reset(token)
+
+        for statement, count in stats.repeated(self.repeat_threshold).items():
+            logger.warning("possible N+1 in %s %s: statement executed %d times: %s",
+                           scope["method"], scope["path"], count, statement[:300])
@@ -0,0 +1,170 @@
+from bisect import bisect_left, insort
+from typing import Iterable, Iterator
+
+
+class FenwickTree:
+    '''Prefix sums over bucket sizes, used to turn (bucket, position) into a rank and back.'''
+
+    def __init__(self, sizes: list[int]):
+        self.size = len(sizes)
+        self.tree = [0] * (self.size + 1)
+        for index, value in enumerate(sizes, start=1):
+            self.tree[index] += value
+            parent = index + (index & -index)
+            if parent <= self.size:
+                self.tree[parent] += self.tree[index]
+
+    def add(self, index: int, delta: int) -> None:
+        index += 1
+        while index <= self.size:
+            self.tree[index] += delta
+            index += index & -index
+
+    # sum of sizes of buckets [0, index)
+    def prefix(self, index: int) -> int:
+        total = 0
+        while index > 0:
+            total += self.tree[index]
+            index -= index & -index
+        return total
+
+    # bucket holding the element at 0-based position, and the position inside the bucket
+    def find(self, position: int) -> tuple[int, int]:
+        index = 0
+        step = 1 << self.size.bit_length()
+        while step:
+            next_index = index + step
+            if next_index <= self.size and self.tree[next_index] <= position:
+                index = next_index
+                position -= self.tree[next_index]
+            step >>= 1
+        return index, position
+
+
+class RankIndex:
+    '''
+    Scores ordered by (score desc, user_id asc) with rank lookups.
+
+    Keys are kept in sorted buckets of about `load` elements (sqrt decomposition),
+    a Fenwick tree over bucket sizes gives ranks and positional access in O(log n),
+    updates cost O(log n) plus a list insert inside one bucket.
+    '''
+
+    def __init__(self, load: int = 512):
+        self.load = load
+        self._buckets: list[list[tuple[int, int]]] = []
+        self._maxes: list[tuple[int, int]] = []
+        self._tree = FenwickTree([])
+        self._scores: dict[int, int] = {}
+
+    # build from (user_id, score) pairs already ordered by score desc, user_id asc - O(n)
+    @classmethod
+    def from_sorted(cls, items: Iterable[tuple[int, int]], load: int = 512) -> "RankIndex":
+        index = cls(load)
+        keys = []
+        for user_id, score in items:
+            index._scores[user_id] = score
+            keys.append((-score, user_id))
+        index._buckets = [keys[start:start + load] for start in range(0, len(keys), load)]
+        index._rebuild()
+        return index
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._scores
+
+    def score(self, user_id: int) -> int | None:
+        return self._scores.get(user_id)
+
+    def _rebuild(self) -> None:
+        self._maxes = [bucket[-1] for bucket in self._buckets]
+        self._tree = FenwickTree([len(bucket) for bucket in self._buckets])
+
+    def _locate(self, key: tuple[int, int]) -> int:
+        index = bisect_left(self._maxes, key)
+        return min(index, len(self._buckets) - 1)
+
+    def _insert(self, key: tuple[int, int]) -> None:
+        if not self._buckets:
+            self._buckets.append([key])
+            self._rebuild()
+            return
+
+        index = self._locate(key)
+        bucket = self._buckets[index]
+        insort(bucket, key)
+        if len(bucket) > 2 * self.load:
+            self._buckets[index:index + 1] = [bucket[:self.load], bucket[self.load:]]
+            self._rebuild()
+        else:
+            self._maxes[index] = bucket[-1]
+            self._tree.add(index, 1)
+
+    def _delete(self, key: tuple[int, int]) -> None:
+        index = self._locate(key)
+        bucket = self._buckets[index]
+        del bucket[bisect_left(bucket, key)]
+        if not bucket:
+            del self._buckets[index]
+            self._rebuild()
+        else:
+            self._maxes[index] = bucket[-1]
+            self._tree.add(index, -1)
+
+    def set(self, user_id: int, score: int) -> None:
+        old_score = self._scores.get(user_id)
+        if old_score == score:
+            return
+        if old_score is not None:
+            self._delete((-old_score, user_id))
+        self._scores[user_id] = score
+        self._insert((-score, user_id))
+
+    def add(self, user_id: int, delta: int) -> int:
+        score = self._scores.get(user_id, 0) + delta
+        self.set(user_id, score)
+        return score
+
+    def remove(self, user_id: int) -> None:
+        score = self._scores.pop(user_id, None)
+        if score is not None:
+            self._delete((-score, user_id))
+
+    # 1-based rank, None if user has no score
+    def rank(self, user_id: int) -> int | None:
+        score = self._scores.get(user_id)
+        if score is None:
+            return None
+        key = (-score, user_id)
+        index = self._locate(key)
+        return self._tree.prefix(index) + bisect_left(self._buckets[index], key) + 1
+
+    # (rank, user_id, score) starting at 0-based position
+    def _iter_from(self, position: int) -> Iterator[tuple[int, int, int]]:
+        if position >= len(self._scores):
+            return
+        index, offset = self._tree.find(position)
+        rank = position + 1
+        for bucket in self._buckets[index:]:
+            for negative_score, user_id in bucket[offset:]:
+                yield rank, user_id, -negative_score
+                rank += 1
+            offset = 0
+
+    def top(self, limit: int, offset: int = 0) -> list[tuple[int, int, int]]:
+        entries = []
+        for entry in self._iter_from(offset):
+            if len(entries) >= limit:
+                break
+            entries.append(entry)
+        return entries
+
+    # user with `radius` neighbours above and below
+    def around(self, user_id: int, radius: int) -> list[tuple[int, int, int]]:
+        rank = self.rank(user_id)
+        if rank is None:
+            return []
+        start = max(rank - 1 - radius, 0)
+        return self.top(rank - 1 - start + radius + 1, start)
@@ -0,0 +1,56 @@
+from fastapi import APIRouter, Depends, Query, Response
+from auth.utils import get_current_user
+from auth.schemas import CurrentUser
+from database import ReadSessionDep
+from leaderboard.utils import (
+    GLOBAL_BOARD, course_board, weekly_board, current_week_start, get_leaderboard, get_leaderboard_position
+    )
+from config import config
+from utils import envelope
+
+router = APIRouter(
+    prefix="/leaderboard",
+    tags=["leaderboard"]
+)
+
+PageLimit = Query(default=None, gt=0, le=config.LEADERBOARD_MAX_PAGE_SIZE)
+Radius = Query(default=5, ge=0, le=50)
+
+
+@router.get("/global")
+async def global_leaderboard(session: ReadSessionDep, response: Response, user: CurrentUser = Depends(get_current_user),
+                             limit: int | None = PageLimit, offset: int = Query(default=0, ge=0)):
+    leaderboard = await get_leaderboard(GLOBAL_BOARD, session, limit, offset)
+    return envelope("Global leaderboard", leaderboard, response)
+
+@router.get("/global/me")
+async def global_position(session: ReadSessionDep, response: Response, user: CurrentUser = Depends(get_current_user),
+                          radius: int = Radius):
+    position = await get_leaderboard_position(GLOBAL_BOARD, user, session, radius)
+    return envelope("Position on global leaderboard", position, response)
+
+
+@router.get("/weekly")
+async def weekly_leaderboard(session: ReadSessionDep, response: Response, user: CurrentUser = Depends(get_current_user),
+                             limit: int | None = PageLimit, offset: int = Query(default=0, ge=0)):
+    leaderboard = await get_leaderboard(weekly_board(current_week_start()), session, limit, offset)
+    return envelope("Leaderboard of this week", leaderboard, response)
+
+@router.get("/weekly/me")
+async def weekly_position(session: ReadSessionDep, response: Response, user: CurrentUser = Depends(get_current_user),
+                          radius: int = Radius):
+    position = await get_leaderboard_position(weekly_board(current_week_start()), user, session, radius)
+    return envelope("Position on leaderboard of this week", position, response)
+
+
+@router.get("/course/{course_id}")
+async def course_leaderboard(course_id: int, session: ReadSessionDep, response: Response, user: CurrentUser = Depends(get_current_user),
+                             limit: int | None = PageLimit, offset: int = Query(default=0, ge=0)):
+    leaderboard = await get_leaderboard(course_board(course_id), session, limit, offset)
+    return envelope(f"Leaderboard for course with id:{course_id}", leaderboard, response)
+
+@router.get("/course/{course_id}/me")
+async def course_position(course_id: int, session: ReadSessionDep, response: Response, user: CurrentUser = Depends(get_current_user),
+                          radius: int = Radius):
+    position = await get_leaderboard_position(course_board(course_id), user, session, radius)
+    return envelope(f"Position on leaderboard for course with id:{course_id}", position, response)
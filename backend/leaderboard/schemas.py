@@ -0,0 +1,21 @@
+from pydantic import BaseModel
+from typing import List
+
+
+class LeaderboardEntry(BaseModel):
+    rank: int
+    user_id: int
+    username: str | None
+    xp: int
+
+
+class LeaderboardPage(BaseModel):
+    total: int  # users on the board
+    entries: List[LeaderboardEntry] = []
+
+
+class LeaderboardPosition(BaseModel):
+    rank: int | None  # None if the user has no xp on this board
+    xp: int = 0
+    total: int
+    entries: List[LeaderboardEntry] = []  # the user and the neighbours around
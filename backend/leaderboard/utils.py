@@ -0,0 +1,298 @@
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from fastapi import HTTPException, status
+from sqlalchemy import select, event
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from auth.schemas import CurrentUser
+from database import async_session_maker
+from models import User, UserXP, UserCourseXP, UserWeeklyXP, XPEvent, Course
+from leaderboard.ranking import RankIndex
+from leaderboard.schemas import LeaderboardEntry, LeaderboardPage, LeaderboardPosition
+from cache import TTLCache
+from metrics import Counter, Gauge, Histogram, register_collector
+from utils import internal_error
+from config import config
+import asyncio
+import time
+
+
+leaderboard_builds = Counter("leaderboard_builds_total", "Leaderboards built from the database.", ("board",))
+leaderboard_build_duration = Histogram("leaderboard_build_duration_seconds", "Time spent building a leaderboard.", ("board",),
+                                       buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0))
+leaderboard_users = Gauge("leaderboard_users", "Users on loaded leaderboards.", ("board",))
+
+
+GLOBAL_BOARD = ("global",)
+
+
+def course_board(course_id: int) -> tuple:
+    return ("course", course_id)
+
+
+def weekly_board(week_start: datetime) -> tuple:
+    return ("weekly", week_start)
+# weeks start on monday (server time), user_weekly_xp rows are keyed by the week start
+
+# weeks start on monday, xp_events.created_at is server time
+def current_week_start(now: datetime | None = None) -> datetime:
+    now = now or datetime.now()
+    return (now - timedelta(days=now.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+@dataclass
+class XPAward:
+    user_id: int
+    amount: int
+    source: str  # e.g., 'lesson_completion', 'quiz_completion'
+    course_id: int | None = None
+
+
+######## AWARDING XP #########
+# every award is written to the xp_events ledger and added to the stored totals (user_xp, user_course_xp,
+# user_weekly_xp) in one upsert each, loaded leaderboards take the new totals once the transaction is committed.
+# totals are absolute, so applying one a board already holds changes nothing
+
+async def award_xp(session: AsyncSession, awards: list[XPAward]) -> dict[int, int]:
+    awards = [award for award in awards if award.amount]
+    if not awards:
+        return {}
+
+    await session.execute(insert(XPEvent), [
+        {"user_id": award.user_id, "course_id": award.course_id, "amount": award.amount, "source": award.source}
+        for award in awards
+    ])
+
+    week_start = current_week_start()
+    gained, course_gained = defaultdict(int), defaultdict(int)
+    for award in awards:
+        gained[award.user_id] += award.amount
+        if award.course_id is not None:
+            course_gained[(award.user_id, award.course_id)] += award.amount
+
+    # rows are locked in key order so concurrent batches cannot deadlock
+    stmt = insert(UserXP).values([
+        {"user_id": user_id, "xp": xp, "level": xp // config.XP_PER_LEVEL + 1}
+        for user_id, xp in sorted(gained.items())
+    ])
+    xp = UserXP.xp + stmt.excluded.xp
+    data = await session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[UserXP.user_id],
+            set_={"xp": xp, "level": xp // config.XP_PER_LEVEL + 1}
+        ).returning(UserXP.user_id, UserXP.xp)
+    )
+    totals = {row.user_id: row.xp for row in data.all()}
+    board_totals = {(GLOBAL_BOARD, user_id): xp for user_id, xp in totals.items()}
+
+    stmt = insert(UserWeeklyXP).values([
+        {"user_id": user_id, "week_start": week_start, "xp": xp} for user_id, xp in sorted(gained.items())
+    ])
+    data = await session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[UserWeeklyXP.user_id, UserWeeklyXP.week_start],
+            set_={"xp": UserWeeklyXP.xp + stmt.excluded.xp}
+        ).returning(UserWeeklyXP.user_id, UserWeeklyXP.xp)
+    )
+    board_totals.update({(weekly_board(week_start), row.user_id): row.xp for row in data.all()})
+
+    if course_gained:
+        stmt = insert(UserCourseXP).values([
+            {"user_id": user_id, "course_id": course_id, "xp": xp}
+            for (user_id, course_id), xp in sorted(course_gained.items())
+        ])
+        data = await session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[UserCourseXP.user_id, UserCourseXP.course_id],
+                set_={"xp": UserCourseXP.xp + stmt.excluded.xp}
+            ).returning(UserCourseXP.user_id, UserCourseXP.course_id, UserCourseXP.xp)
+        )
+        board_totals.update({(course_board(row.course_id), row.user_id): row.xp for row in data.all()})
+
+    session.info.setdefault("xp_totals", {}).update(board_totals)
+    return totals
+
+
+@event.listens_for(Session, "after_commit")
+def apply_leaderboard_updates(session):
+    totals = session.info.pop("xp_totals", None)
+    if totals:
+        leaderboards.apply(totals)
+
+
+@event.listens_for(Session, "after_rollback")
+def discard_leaderboard_updates(session):
+    session.info.pop("xp_totals", None)
+##############################
+
+
+def course_not_found(course_id: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail={
+            "success": False,
+            "message": f"Course with id:{course_id} was not found.",
+            "data": None
+        }
+    )
+
+
+# totals only grow, a total older than the one on the board (committed out of order, or already loaded) is ignored
+def set_total(index: RankIndex, user_id: int, total: int) -> None:
+    if total > (index.score(user_id) or 0):
+        index.set(user_id, total)
+
+
+@dataclass
+class Board:
+    index: RankIndex
+    built_at: float
+
+
+class Leaderboards:
+    '''
+    In-memory leaderboards of this process: global xp, xp per course and xp of the current week.
+
+    A board is built once from the stored totals on the primary database (read in index order)
+    and then kept up to date by committed awards, so top-N and rank lookups never sort in SQL.
+    Totals committed while a board is being built are replayed onto the new board, totals only grow,
+    so the larger of the loaded and the replayed one is kept and nothing is counted twice.
+    Awards committed by other workers are only seen after the periodic rebuild (refresh seconds),
+    stale boards keep serving while one request rebuilds them. Least recently used boards (and their locks) are dropped.
+    '''
+
+    def __init__(self, maxsize: int, refresh: float, session_maker=async_session_maker):
+        self.refresh = refresh
+        self.session_maker = session_maker
+        self._boards = TTLCache(maxsize=maxsize, ttl=float("inf"))
+        self._locks = TTLCache(maxsize=maxsize, ttl=float("inf"))
+        # board key -> (user_id, total) committed while it is being built
+        self._building: dict[tuple, list[tuple[int, int]]] = {}
+
+    def _lock(self, key: tuple) -> asyncio.Lock:
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks.set(key, lock)
+        return lock
+
+    async def get(self, key: tuple) -> RankIndex:
+        board = self._boards.get(key)
+        lock = self._lock(key)
+        if board is not None and (time.monotonic() - board.built_at < self.refresh or lock.locked()):
+            return board.index
+
+        async with lock:
+            current = self._boards.get(key)
+            # nobody rebuilt it while we were waiting
+            if current is None or current is board:
+                current = await self.build(key)
+        return current.index
+
+    async def build(self, key: tuple) -> Board:
+        self._building[key] = []
+        try:
+            with leaderboard_build_duration.time(key[0]):
+                index = await self.load(key)
+            for user_id, total in self._building[key]:
+                set_total(index, user_id, total)
+        finally:
+            del self._building[key]
+
+        leaderboard_builds.inc(key[0])
+        board = Board(index, time.monotonic())
+        self._boards.set(key, board)
+        return board
+
+    # read from the primary, a lagging replica would miss the latest awards until the next rebuild
+    async def load(self, key: tuple) -> RankIndex:
+        if key == GLOBAL_BOARD:
+            query = select(UserXP.user_id, UserXP.xp).filter(UserXP.xp > 0).order_by(UserXP.xp.desc(), UserXP.user_id)
+        elif key[0] == "course":
+            query = select(UserCourseXP.user_id, UserCourseXP.xp).filter(
+                UserCourseXP.course_id == key[1], UserCourseXP.xp > 0
+            ).order_by(UserCourseXP.xp.desc(), UserCourseXP.user_id)
+        else:
+            query = select(UserWeeklyXP.user_id, UserWeeklyXP.xp).filter(
+                UserWeeklyXP.week_start == key[1], UserWeeklyXP.xp > 0
+            ).order_by(UserWeeklyXP.xp.desc(), UserWeeklyXP.user_id)
+
+        try:
+            async with self.session_maker() as session:
+                if key[0] == "course":
+                    data = await session.execute(select(Course.id).filter(Course.id == key[1]))
+                    if data.scalar_one_or_none() is None:
+                        raise course_not_found(key[1])
+                result = await session.stream(query.execution_options(yield_per=10000))
+                return RankIndex.from_sorted([(user_id, int(xp)) async for user_id, xp in result])
+        except SQLAlchemyError:
+            raise internal_error
+
+    # committed awards: (board key, user_id) -> total
+    def apply(self, totals: dict[tuple, int]) -> None:
+        for (key, user_id), total in totals.items():
+            board = self._boards.get(key)
+            if board is not None:
+                set_total(board.index, user_id, total)
+            building = self._building.get(key)
+            if building is not None:
+                building.append((user_id, total))
+
+    def sizes(self) -> dict[str, int]:
+        sizes = defaultdict(int)
+        for key, board in self._boards.items():
+            sizes[key[0]] += len(board.index)
+        return sizes
+
+
+leaderboards = Leaderboards(maxsize=config.LEADERBOARD_MAX_BOARDS, refresh=config.LEADERBOARD_REFRESH_SECONDS)
+
+
+def collect_leaderboard_metrics() -> None:
+    sizes = leaderboards.sizes()
+    for board in ("global", "course", "weekly"):
+        leaderboard_users.set(sizes.get(board, 0), board)
+
+
+register_collector(collect_leaderboard_metrics)
+
+
+# attach usernames to (rank, user_id, xp) entries with one query
+async def get_entries(entries: list[tuple[int, int, int]], session: AsyncSession) -> list[LeaderboardEntry]:
+    if not entries:
+        return []
+
+    try:
+        data = await session.execute(
+            select(User.id, User.username).filter(User.id.in_([user_id for _, user_id, _ in entries]))
+        )
+    except SQLAlchemyError:
+        raise internal_error
+
+    usernames = dict(data.all())
+    return [
+        LeaderboardEntry(rank=rank, user_id=user_id, username=usernames.get(user_id), xp=xp)
+        for rank, user_id, xp in entries
+    ]
+
+
+# page of a leaderboard
+async def get_leaderboard(key: tuple, session: AsyncSession, limit: int | None = None, offset: int = 0) -> LeaderboardPage:
+    board = await leaderboards.get(key)
+    entries = board.top(limit or config.LEADERBOARD_PAGE_SIZE, offset)
+    return LeaderboardPage(total=len(board), entries=await get_entries(entries, session))
+
+
+# rank of the user with radius neighbours above and below
+async def get_leaderboard_position(key: tuple, user: CurrentUser, session: AsyncSession, radius: int) -> LeaderboardPosition:
+    board = await leaderboards.get(key)
+    entries = board.around(user.id, radius)
+    return LeaderboardPosition(
+        rank=board.rank(user.id),
+        xp=board.score(user.id) or 0,
+        total=len(board),
+        entries=await get_entries(entries, session)
+    )
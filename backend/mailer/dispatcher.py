@@ -0,0 +1,234 @@
+from email.message import EmailMessage
+from datetime import timedelta
+from sqlalchemy import select, update, func, bindparam, Interval
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import async_session_maker
+from models import EmailOutbox
+from config import config
+import aiosmtplib
+import asyncio
+import logging
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+# add email to the outbox, it will be sent after the session is committed
+def enqueue_email(session: AsyncSession, recipient: str, subject: str, body: str) -> EmailOutbox:
+    email = EmailOutbox(recipient=recipient, subject=subject, body=body, status="pending", attempts=0)
+    session.add(email)
+    return email
+
+
+class SMTPConnection:
+    '''
+    Single SMTP connection reused across batches.
+    Reconnects lazily and closes itself after EMAIL_SMTP_IDLE_TIMEOUT seconds without traffic.
+    '''
+
+    def __init__(self, hostname: str, port: int, use_tls: bool, username: str | None, password: str | None,
+                 idle_timeout: float):
+        self.hostname = hostname
+        self.port = port
+        self.use_tls = use_tls
+        self.username = username
+        self.password = password
+        self.idle_timeout = idle_timeout
+        self._client: aiosmtplib.SMTP | None = None
+        self._last_used = 0.0
+
+    async def _connect(self) -> aiosmtplib.SMTP:
+        client = aiosmtplib.SMTP(
+            hostname=self.hostname,
+            port=self.port,
+            use_tls=self.use_tls,
+            start_tls=None if self.use_tls else False
+        )
+        await client.connect()
+        if self.username and self.password:
+            await client.login(self.username, self.password)
+        return client
+
+    async def send(self, message: EmailMessage) -> None:
+        if self._client is None or not self._client.is_connected:
+            self._client = await self._connect()
+        try:
+            await self._client.send_message(message)
+        except aiosmtplib.SMTPServerDisconnected:
+            # server dropped idle connection, try once more on a fresh one
+            self._client = await self._connect()
+            await self._client.send_message(message)
+        self._last_used = time.monotonic()
+
+    async def close_if_idle(self) -> None:
+        if self._client is not None and time.monotonic() - self._last_used > self.idle_timeout:
+            await self.close()
+
+    async def close(self) -> None:
+        if self._client is not None and self._client.is_connected:
+            try:
+                await self._client.quit()
+            except (aiosmtplib.SMTPException, OSError):
+                self._client.close()
+        self._client = None
+
+
+class EmailDispatcher:
+    '''
+    Background worker delivering EmailOutbox rows.
+
+    Rows are claimed in batches with FOR UPDATE SKIP LOCKED (safe with several app workers) and leased
+    for EMAIL_SEND_LEASE_SECONDS, sent over one pooled SMTP connection outside of any transaction,
+    failed rows are retried with exponential backoff until EMAIL_MAX_ATTEMPTS is reached.
+    '''
+
+    def __init__(self, connection: SMTPConnection, sender: str, batch_size: int, max_attempts: int,
+                 retry_base_seconds: float, poll_interval: float, lease_seconds: float,
+                 session_maker=async_session_maker):
+        self.connection = connection
+        self.sender = sender
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_base_seconds = retry_base_seconds
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.session_maker = session_maker
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._stopping = False
+
+    def start(self) -> None:
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        self._stopping = True
+        self._wakeup.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        await self.connection.close()
+
+    # wake dispatcher after new emails were committed
+    def notify(self) -> None:
+        self._wakeup.set()
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                sent = await self.dispatch_batch()
+            except (SQLAlchemyError, OSError) as e:
+                logger.warning("email dispatch failed: %s", e)
+                sent = 0
+            except Exception:
+                # keep the loop alive, claimed rows are retried once their lease expires
+                logger.exception("email dispatch failed unexpectedly")
+                await self.connection.close()
+                sent = 0
+
+            # full batch -> there is probably more work, do not wait
+            if sent >= self.batch_size:
+                continue
+
+            await self.connection.close_if_idle()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def _build_message(self, email: EmailOutbox) -> EmailMessage:
+        message = EmailMessage()
+        message["Subject"] = email.subject
+        message["From"] = self.sender
+        message["To"] = email.recipient
+        message.set_content(email.body)
+        return message
+
+    # claim due emails in a short transaction: rows are marked 'sending' and leased until next_attempt_at,
+    # rows of a worker that died mid-batch are claimed again once their lease has expired
+    async def claim_batch(self) -> list:
+        async with self.session_maker() as session:
+            due = select(EmailOutbox.id).filter(
+                EmailOutbox.status.in_(("pending", "sending")),
+                EmailOutbox.next_attempt_at <= func.now()
+            ).order_by(EmailOutbox.id).limit(self.batch_size).with_for_update(skip_locked=True).scalar_subquery()
+
+            data = await session.execute(
+                update(EmailOutbox).filter(EmailOutbox.id.in_(due)).values(
+                    status="sending", next_attempt_at=func.now() + timedelta(seconds=self.lease_seconds)
+                ).returning(
+                    EmailOutbox.id, EmailOutbox.recipient, EmailOutbox.subject, EmailOutbox.body, EmailOutbox.attempts
+                ).execution_options(synchronize_session=False)
+            )
+            emails = sorted(data.all(), key=lambda email: email.id)
+            await session.commit()
+            return emails
+
+    # send one batch of due emails, returns number of processed rows.
+    # no transaction (nor pooled connection) is held while SMTP is talking
+    async def dispatch_batch(self) -> int:
+        emails = await self.claim_batch()
+        if not emails:
+            return 0
+
+        sent_ids, failures = [], []
+        for email in emails:
+            try:
+                await self.connection.send(self._build_message(email))
+                sent_ids.append(email.id)
+            except Exception as e:
+                # a broken message (e.g. encoding error) fails alone instead of blocking the batch
+                if not isinstance(e, (aiosmtplib.SMTPException, OSError)):
+                    logger.exception("email %d could not be sent", email.id)
+                await self.connection.close()
+                attempts = email.attempts + 1
+                backoff = self.retry_base_seconds * 2 ** (attempts - 1)
+                failures.append({
+                    "b_id": email.id,
+                    "b_attempts": attempts,
+                    "b_status": "failed" if attempts >= self.max_attempts else "pending",
+                    "b_backoff": timedelta(seconds=backoff),
+                    "b_error": str(e)[:500]
+                })
+
+        async with self.session_maker() as session:
+            if sent_ids:
+                await session.execute(
+                    update(EmailOutbox).filter(EmailOutbox.id.in_(sent_ids)).values(
+                        status="sent", attempts=EmailOutbox.attempts + 1, last_error=None
+                    ).execution_options(synchronize_session=False)
+                )
+            if failures:
+                await session.execute(
+                    update(EmailOutbox.__table__).where(EmailOutbox.id == bindparam("b_id")).values(
+                        status=bindparam("b_status"),
+                        attempts=bindparam("b_attempts"),
+                        next_attempt_at=func.now() + bindparam("b_backoff", type_=Interval),
+                        last_error=bindparam("b_error")
+                    ),
+                    failures
+                )
+            await session.commit()
+        return len(emails)
+
+
+dispatcher = EmailDispatcher(
+    connection=SMTPConnection(
+        hostname=config.EMAIL_SMTP_SERVER,
+        port=config.EMAIL_SMTP_SERVER_PORT,
+        use_tls=config.EMAIL_SMTP_USE_TLS,
+        username=config.EMAIL,
+        password=config.EMAIL_PASS,
+        idle_timeout=config.EMAIL_SMTP_IDLE_TIMEOUT
+    ),
+    sender=config.EMAIL,
+    batch_size=config.EMAIL_BATCH_SIZE,
+    max_attempts=config.EMAIL_MAX_ATTEMPTS,
+    retry_base_seconds=config.EMAIL_RETRY_BASE_SECONDS,
+    poll_interval=config.EMAIL_POLL_INTERVAL,
+    lease_seconds=config.EMAIL_SEND_LEASE_SECONDS
+)
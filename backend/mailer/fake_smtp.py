@@ -0,0 +1,111 @@
+'''
+Minimal local SMTP server that accepts every message and keeps it in memory.
+Meant for development and tests, run the app with:
+
+    EMAIL_SMTP_SERVER=127.0.0.1 EMAIL_SMTP_SERVER_PORT=8025 EMAIL_SMTP_USE_TLS=false
+
+Usage (from backend directory):
+    python -m mailer.fake_smtp --port 8025
+'''
+from dataclasses import dataclass, field
+from email import message_from_bytes
+from email.message import Message
+import argparse
+import asyncio
+
+
+@dataclass
+class ReceivedMessage:
+    sender: str
+    recipients: list[str]
+    data: bytes
+    message: Message = field(init=False)
+
+    def __post_init__(self):
+        self.message = message_from_bytes(self.data)
+
+
+class FakeSMTPServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 8025):
+        self.host = host
+        self.port = port
+        self.messages: list[ReceivedMessage] = []
+        self.connections = 0
+        self._server: asyncio.base_events.Server | None = None
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        # port 0 -> pick free port
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+
+        async def reply(line: str) -> None:
+            writer.write(line.encode() + b"\r\n")
+            await writer.drain()
+
+        await reply("220 fake-smtp ready")
+        sender, recipients = "", []
+        try:
+            while line := await reader.readline():
+                command = line.decode(errors="replace").strip()
+                verb = command.split(" ", 1)[0].upper()
+
+                if verb in ("EHLO", "HELO"):
+                    await reply("250-fake-smtp")
+                    await reply("250 AUTH PLAIN LOGIN")
+                elif verb == "AUTH":
+                    await reply("235 Authentication successful")
+                elif verb == "MAIL":
+                    sender, recipients = command.split(":", 1)[1].strip(" <>"), []
+                    await reply("250 OK")
+                elif verb == "RCPT":
+                    recipients.append(command.split(":", 1)[1].strip(" <>"))
+                    await reply("250 OK")
+                elif verb == "DATA":
+                    await reply("354 End data with <CR><LF>.<CR><LF>")
+                    chunks = []
+                    while (chunk := await reader.readline()) not in (b".\r\n", b".\n", b""):
+                        # undo dot stuffing
+                        chunks.append(chunk[1:] if chunk.startswith(b"..") else chunk)
+                    self.messages.append(ReceivedMessage(sender, recipients, b"".join(chunks)))
+                    await reply("250 OK")
+                elif verb in ("RSET", "NOOP"):
+                    await reply("250 OK")
+                elif verb == "QUIT":
+                    await reply("221 Bye")
+                    break
+                else:
+                    await reply("502 Command not implemented")
+        finally:
+            writer.close()
+
+
+async def serve(host: str, port: int) -> None:
+    server = FakeSMTPServer(host, port)
+    await server.start()
+    print(f"Fake SMTP server listening on {server.host}:{server.port}")
+
+    printed = 0
+    while True:
+        await asyncio.sleep(1)
+        for received in server.messages[printed:]:
+            print(f"--- {received.sender} -> {', '.join(received.recipients)}")
+            print(received.data.decode(errors="replace"))
+        printed = len(server.messages)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8025)
+    args = parser.parse_args()
+
+    asyncio.run(serve(args.host, args.port))
@@ -0,0 +1,191 @@
+'''
+Minimal in-process metrics in Prometheus text exposition format.
+
+Metrics are module level objects updated on the hot path with a dict lookup and an addition,
+values that are cheap to read on demand (pool usage, queue depth) are filled in by collectors
+right before /metrics is rendered.
+'''
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from typing import Callable
+import threading
+import time
+
+
+# latency buckets in seconds
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+registry: list["Metric"] = []
+collectors: list[Callable[[], None]] = []
+
+
+class Metric(ABC):
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._lock = threading.Lock()
+        registry.append(self)
+
+    def _format_labels(self, values: tuple, extra: str = "") -> str:
+        pairs = ['%s="%s"' % (name, str(value).replace('"', "'")) for name, value in zip(self.labels, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    @abstractmethod
+    def samples(self) -> list[str]:
+        ...
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}", *self.samples()]
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, *label_values, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    # for totals kept elsewhere (e.g. pool wait counters), read by collectors
+    def set_total(self, value: float, *label_values) -> None:
+        self._values[label_values] = value
+
+    def samples(self) -> list[str]:
+        return [f"{self.name}{self._format_labels(labels)} {value}" for labels, value in list(self._values.items())]
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: dict[tuple, float] = {}
+
+    def set(self, value: float, *label_values) -> None:
+        self._values[label_values] = value
+
+    def inc(self, *label_values, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def dec(self, *label_values, amount: float = 1.0) -> None:
+        self.inc(*label_values, amount=-amount)
+
+    def samples(self) -> list[str]:
+        return [f"{self.name}{self._format_labels(labels)} {value}" for labels, value in list(self._values.items())]
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per bucket counts (+Inf last), sum]
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, value: float, *label_values) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(label_values)
+            if entry is None:
+                entry = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    # time a block: with histogram.time("label"): ...
+    def time(self, *label_values) -> "Timer":
+        return Timer(self, label_values)
+
+    def samples(self) -> list[str]:
+        lines = []
+        with self._lock:
+            values = [(labels, list(counts), total) for labels, (counts, total) in self._values.items()]
+        for labels, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                bucket_labels = self._format_labels(labels, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            cumulative += counts[-1]
+            bucket_labels = self._format_labels(labels, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{self._format_labels(labels)} {total}")
+            lines.append(f"{self.name}_count{self._format_labels(labels)} {cumulative}")
+        return lines
+
+
+class Timer:
+    def __init__(self, histogram: Histogram, label_values: tuple):
+        self.histogram = histogram
+        self.label_values = label_values
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, *self.label_values)
+
+
+# called before rendering to refresh gauges read from other components
+def register_collector(collector: Callable[[], None]) -> None:
+    collectors.append(collector)
+
+
+def render() -> str:
+    for collector in collectors:
+        collector()
+    lines = []
+    for metric in registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+http_requests = Counter("http_requests_total", "HTTP requests by route and status.", ("method", "route", "status"))
+http_request_duration = Histogram("http_request_duration_seconds", "HTTP request latency by route.", ("method", "route"))
+http_requests_in_flight = Gauge("http_requests_in_flight", "HTTP requests being served.")
+
+
+class MetricsMiddleware:
+    '''
+    ASGI middleware recording request count, latency and in-flight requests.
+    Requests are labelled with the route template (/api/user/lesson/{lesson_id}), not the raw path,
+    to keep the number of series bounded.
+    '''
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        http_requests_in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            http_requests_in_flight.dec()
+            route = scope.get("route")
+            route_path = route.path if route is not None else "unmatched"
+            http_requests.inc(scope["method"], route_path, status)
+            http_request_duration.observe(elapsed, scope["method"], route_path)
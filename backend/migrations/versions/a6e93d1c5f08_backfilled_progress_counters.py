@@ -0,0 +1,59 @@
+"""Backfilled progress counters
+
+Revision ID: a6e93d1c5f08
+Revises: 8d41b6f09e27
+Create Date: 2026-10-17 17:08:44.631590
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a6e93d1c5f08'
+down_revision: Union[str, None] = '8d41b6f09e27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # counters were never maintained before incremental roll-up, recount them once from user_lessons
+    op.execute(sa.text("""
+        UPDATE user_chapters SET
+            lesson_completed = counts.completed,
+            is_completed = user_chapters.lesson_total > 0 AND counts.completed >= user_chapters.lesson_total,
+            progress = CASE
+                WHEN user_chapters.lesson_total <= 0 THEN 0.0
+                ELSE LEAST(counts.completed * 100.0 / user_chapters.lesson_total, 100.0)
+            END
+        FROM (
+            SELECT user_lessons.user_id, lessons.chapter_id, count(*) FILTER (WHERE user_lessons.is_completed) AS completed
+            FROM user_lessons JOIN lessons ON lessons.id = user_lessons.lesson_id
+            GROUP BY user_lessons.user_id, lessons.chapter_id
+        ) AS counts
+        WHERE user_chapters.user_id = counts.user_id AND user_chapters.chapter_id = counts.chapter_id
+    """))
+    op.execute(sa.text("""
+        UPDATE user_courses SET
+            chapter_completed = counts.completed,
+            is_completed = user_courses.chapter_total > 0 AND counts.completed >= user_courses.chapter_total,
+            progress = CASE
+                WHEN user_courses.chapter_total <= 0 THEN 0.0
+                ELSE LEAST(counts.completed * 100.0 / user_courses.chapter_total, 100.0)
+            END
+        FROM (
+            SELECT user_chapters.user_id, chapters.course_id, count(*) FILTER (WHERE user_chapters.is_completed) AS completed
+            FROM user_chapters JOIN chapters ON chapters.id = user_chapters.chapter_id
+            GROUP BY user_chapters.user_id, chapters.course_id
+        ) AS counts
+        WHERE user_courses.user_id = counts.user_id AND user_courses.course_id = counts.course_id
+    """))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # data only migration, counters are kept
+    pass
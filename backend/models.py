@@ -1,6 +1,7 @@
 from database import Base
-from sqlalchemy import Column, Integer, BigInteger, String, Date, ForeignKey, Boolean, DateTime
+from sqlalchemy import Column, Integer, BigInteger, String, Text, Date, ForeignKey, Boolean, DateTime, Index, func, desc
 from sqlalchemy.orm import Mapped, mapped_column, relationship
+from datetime import datetime
 
 
 # Define the User model
@@ -55,9 +56,13 @@ class Chapter(Base):
     # Relationship to lessons and users
     course = relationship("Course", back_populates="chapters")
     created_by_user = relationship("User", back_populates="created_chapters")
-    lessons = relationship("Lesson", back_populates="chapter")
+    lessons = relationship("Lesson", back_populates="chapter", order_by="Lesson.order")
     users = relationship("UserChapter", back_populates="chapter")
 
+    __table_args__ = (
+        Index('ix_chapters_course_id_order', 'course_id', 'order'),
+    )
+
 
 class Course(Base):
     __tablename__ = 'courses'
@@ -67,7 +72,7 @@ class Course(Base):
     description: Mapped[str] = mapped_column(String(500), nullable=True)
     created_by: Mapped[int] = mapped_column(ForeignKey('users.id'), nullable=False)
 
-    chapters = relationship("Chapter", back_populates="course", cascade="all, delete")
+    chapters = relationship("Chapter", back_populates="course", cascade="all, delete", order_by="Chapter.order")
     created_by_user = relationship("User", back_populates="created_courses")
     users = relationship("UserCourse", back_populates="course")
 
@@ -85,11 +90,15 @@ class Lesson(Base):
 
     chapter = relationship("Chapter", back_populates="lessons")
     created_by_user = relationship("User", back_populates="created_lessons")
-    materials = relationship("LessonMaterial", back_populates="lesson", cascade="all, delete")
-    quizzes = relationship("Quiz", back_populates="lesson", cascade="all, delete")
+    materials = relationship("LessonMaterial", back_populates="lesson", cascade="all, delete", order_by="LessonMaterial.order")
+    quizzes = relationship("Quiz", back_populates="lesson", cascade="all, delete", order_by="Quiz.id")
     comments = relationship("CommentLesson", back_populates="lesson", cascade="all, delete")
     users = relationship("UserLesson", back_populates="lesson")
 
+    __table_args__ = (
+        Index('ix_lessons_chapter_id_order', 'chapter_id', 'order'),
+    )
+
 
 
 class LessonMaterial(Base):
@@ -104,6 +113,10 @@ class LessonMaterial(Base):
 
     lesson = relationship("Lesson", back_populates="materials")
 
+    __table_args__ = (
+        Index('ix_lesson_materials_lesson_id_order', 'lesson_id', 'order'),
+    )
+
 
 class Quiz(Base):
     __tablename__ = 'quizzes'
@@ -115,11 +128,15 @@ class Quiz(Base):
     created_by: Mapped[int] = mapped_column(ForeignKey('users.id'), nullable=False)
 
     lesson = relationship("Lesson", back_populates="quizzes")
-    questions = relationship("QuizQuestion", back_populates="quiz", cascade="all, delete")
+    questions = relationship("QuizQuestion", back_populates="quiz", cascade="all, delete", order_by="QuizQuestion.order")
     created_by_user = relationship("User", back_populates="created_quizzes")
     comments = relationship("CommentQuiz", back_populates="quiz", cascade="all, delete")
     users = relationship("UserQuiz", back_populates="quiz")
 
+    __table_args__ = (
+        Index('ix_quizzes_lesson_id', 'lesson_id'),
+    )
+
 
 class QuizQuestion(Base):
     __tablename__ = 'quiz_questions'
@@ -134,9 +151,13 @@ class QuizQuestion(Base):
 
     quiz = relationship("Quiz", back_populates="questions")
     created_by_user = relationship("User", back_populates="created_quiz_questions")
-    multiple_choice_options = relationship("QuizQuestionMultipleChoice", back_populates="question", cascade="all, delete")
-    single_choice_options = relationship("QuizQuestionSingleChoice", back_populates="question", cascade="all, delete")
-    short_answer_options = relationship("QuizQuestionShortAnswer", back_populates="question", cascade="all, delete")
+    multiple_choice_options = relationship("QuizQuestionMultipleChoice", back_populates="question", cascade="all, delete", order_by="QuizQuestionMultipleChoice.id")
+    single_choice_options = relationship("QuizQuestionSingleChoice", back_populates="question", cascade="all, delete", order_by="QuizQuestionSingleChoice.id")
+    short_answer_options = relationship("QuizQuestionShortAnswer", back_populates="question", cascade="all, delete", order_by="QuizQuestionShortAnswer.id")
+
+    __table_args__ = (
+        Index('ix_quiz_questions_quiz_id_order', 'quiz_id', 'order'),
+    )
 
 
 class QuizQuestionMultipleChoice(Base):
@@ -149,7 +170,11 @@ class QuizQuestionMultipleChoice(Base):
 
 
     question = relationship("QuizQuestion", back_populates="multiple_choice_options")
-    options = relationship("QuizQuestionMultipleChoiceOption", back_populates="question_multiple_choice", cascade="all, delete")
+    options = relationship("QuizQuestionMultipleChoiceOption", back_populates="question_multiple_choice", cascade="all, delete", order_by="QuizQuestionMultipleChoiceOption.id")
+
+    __table_args__ = (
+        Index('ix_quiz_question_multiple_choice_question_id', 'question_id'),
+    )
 
 class QuizQuestionMultipleChoiceOption(Base):
     __tablename__ = 'quiz_question_multiple_choice_options'
@@ -161,6 +186,9 @@ class QuizQuestionMultipleChoiceOption(Base):
 
     question_multiple_choice = relationship("QuizQuestionMultipleChoice", back_populates="options")
 
+    __table_args__ = (
+        Index('ix_multiple_choice_options_question_multiple_choice_id', 'question_multiple_choice_id'),
+    )
 
 class QuizQuestionSingleChoice(Base):
     __tablename__ = 'quiz_question_single_choice'
@@ -171,7 +199,11 @@ class QuizQuestionSingleChoice(Base):
     question_description: Mapped[str] = mapped_column(String(512), nullable=True)
 
     question = relationship("QuizQuestion", back_populates="single_choice_options")
-    options = relationship("QuizQuestionSingleChoiceOption", back_populates="question_single_choice", cascade="all, delete")
+    options = relationship("QuizQuestionSingleChoiceOption", back_populates="question_single_choice", cascade="all, delete", order_by="QuizQuestionSingleChoiceOption.id")
+
+    __table_args__ = (
+        Index('ix_quiz_question_single_choice_question_id', 'question_id'),
+    )
 
 class QuizQuestionSingleChoiceOption(Base):
     __tablename__ = 'quiz_question_single_choice_options'
@@ -183,6 +215,10 @@ class QuizQuestionSingleChoiceOption(Base):
 
     question_single_choice = relationship("QuizQuestionSingleChoice", back_populates="options")
 
+    __table_args__ = (
+        Index('ix_single_choice_options_question_single_choice_id', 'question_single_choice_id'),
+    )
+
 class QuizQuestionShortAnswer(Base):
     __tablename__ = 'quiz_question_short_answer'
 
@@ -194,6 +230,9 @@ class QuizQuestionShortAnswer(Base):
 
     question = relationship("QuizQuestion", back_populates="short_answer_options")
 
+    __table_args__ = (
+        Index('ix_quiz_question_short_answer_question_id', 'question_id'),
+    )
 
 class UserCourse(Base):
     __tablename__ = 'user_courses'
@@ -209,6 +248,10 @@ class UserCourse(Base):
     user = relationship("User", back_populates="courses")
     course = relationship("Course", back_populates="users")
 
+    __table_args__ = (
+        Index('ix_user_courses_user_id_course_id', 'user_id', 'course_id', unique=True),
+    )
+
 
 class UserChapter(Base):
     __tablename__ = 'user_chapters'
@@ -224,6 +267,10 @@ class UserChapter(Base):
     user = relationship("User", back_populates="chapters")
     chapter = relationship("Chapter", back_populates="users")
 
+    __table_args__ = (
+        Index('ix_user_chapters_user_id_chapter_id', 'user_id', 'chapter_id', unique=True),
+    )
+
 
 class UserLesson(Base):
     __tablename__ = 'user_lessons'
@@ -237,6 +284,10 @@ class UserLesson(Base):
     user = relationship("User", back_populates="lessons")
     lesson = relationship("Lesson", back_populates="users")
 
+    __table_args__ = (
+        Index('ix_user_lessons_user_id_lesson_id', 'user_id', 'lesson_id', unique=True),
+    )
+
 class UserQuiz(Base):
     __tablename__ = 'user_quizzes'
 
@@ -249,6 +300,10 @@ class UserQuiz(Base):
     user = relationship("User", back_populates="quizzes")
     quiz = relationship("Quiz", back_populates="users")
 
+    __table_args__ = (
+        Index('ix_user_quizzes_user_id_quiz_id', 'user_id', 'quiz_id', unique=True),
+    )
+
 
 class Achievement(Base):
     __tablename__ = 'achievements'
@@ -274,6 +329,25 @@ class UserAchievement(Base):
     user = relationship("User", back_populates="achievements")
     achievement = relationship("Achievement", back_populates="users")
 
+    __table_args__ = (
+        Index('ix_user_achievements_user_id_achievement_id', 'user_id', 'achievement_id', unique=True),
+    )
+
+
+# Running count of achievement events (by achievement type) per user, thresholds are checked against it
+class UserAchievementCounter(Base):
+    __tablename__ = 'user_achievement_counters'
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey('users.id', ondelete="CASCADE"), nullable=False)
+    type: Mapped[str] = mapped_column(String(50), nullable=False)  # same values as Achievement.type
+    count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+    __table_args__ = (
+        Index('ix_user_achievement_counters_user_id_type', 'user_id', 'type', unique=True),
+        Index('ix_user_achievement_counters_type_count', 'type', 'count'),  # rule backfill
+    )
+
 class UserXP(Base):
     __tablename__ = 'user_xp'
 
@@ -284,6 +358,60 @@ class UserXP(Base):
 
     user = relationship("User", back_populates="xp")
 
+    __table_args__ = (
+        Index('ix_user_xp_user_id', 'user_id', unique=True),
+        # global leaderboard order
+        Index('ix_user_xp_xp_user_id', desc('xp'), 'user_id'),
+    )
+
+
+# XP ledger, per-course and weekly totals are kept in user_course_xp and user_weekly_xp
+class XPEvent(Base):
+    __tablename__ = 'xp_events'
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey('users.id', ondelete="CASCADE"), nullable=False)
+    course_id: Mapped[int] = mapped_column(ForeignKey('courses.id', ondelete="CASCADE"), nullable=True)
+    amount: Mapped[int] = mapped_column(Integer, nullable=False)
+    source: Mapped[str] = mapped_column(String(50), nullable=False)  # e.g., 'lesson_completion', 'quiz_completion', 'course_completion'
+
+    __table_args__ = (
+        Index('ix_xp_events_course_id_user_id', 'course_id', 'user_id'),
+        Index('ix_xp_events_created_at', 'created_at'),
+    )
+
+
+# XP earned per course, course leaderboards are built from it
+class UserCourseXP(Base):
+    __tablename__ = 'user_course_xp'
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey('users.id', ondelete="CASCADE"), nullable=False)
+    course_id: Mapped[int] = mapped_column(ForeignKey('courses.id', ondelete="CASCADE"), nullable=False)
+    xp: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+    __table_args__ = (
+        Index('ix_user_course_xp_user_id_course_id', 'user_id', 'course_id', unique=True),
+        # course leaderboard order
+        Index('ix_user_course_xp_course_id_xp_user_id', 'course_id', desc('xp'), 'user_id'),
+    )
+
+
+# XP earned per week (weeks start on monday), weekly leaderboards are built from it
+class UserWeeklyXP(Base):
+    __tablename__ = 'user_weekly_xp'
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey('users.id', ondelete="CASCADE"), nullable=False)
+    week_start: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    xp: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+    __table_args__ = (
+        Index('ix_user_weekly_xp_user_id_week_start', 'user_id', 'week_start', unique=True),
+        # weekly leaderboard order
+        Index('ix_user_weekly_xp_week_start_xp_user_id', 'week_start', desc('xp'), 'user_id'),
+    )
+
 
 # User lives that gives user the ability to retry a quiz
 class UserQuizLife(Base):
@@ -292,9 +420,15 @@ class UserQuizLife(Base):
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(ForeignKey('users.id', ondelete="CASCADE"), nullable=False)
     lives: Mapped[int] = mapped_column(Integer, default=3, nullable=False)  # Number of lives available for the user
+    # lives regenerate from this moment (quiz.lives computes the current value on read, nothing is written until a life is spent)
+    last_spent_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now(), nullable=False)
 
     user = relationship("User", back_populates="quiz_lives")
 
+    __table_args__ = (
+        Index('ix_user_quiz_lives_user_id', 'user_id', unique=True),
+    )
+
 
 class CommentLesson(Base):
     __tablename__ = 'comment_lessons'
@@ -308,6 +442,10 @@ class CommentLesson(Base):
     lesson = relationship("Lesson", back_populates="comments")
     user = relationship("User", back_populates="comments_lesson")
 
+    __table_args__ = (
+        Index('ix_comment_lessons_lesson_id_created_at_id', 'lesson_id', 'created_at', 'id'),
+    )
+
 class CommentQuiz(Base):
     __tablename__ = 'comment_quizzes'
 
@@ -320,6 +458,10 @@ class CommentQuiz(Base):
     quiz = relationship("Quiz", back_populates="comments")
     user = relationship("User", back_populates="comments_quiz")
 
+    __table_args__ = (
+        Index('ix_comment_quizzes_quiz_id_created_at_id', 'quiz_id', 'created_at', 'id'),
+    )
+
 
 class InAppNotification(Base):
     __tablename__ = 'in_app_notifications'
@@ -357,4 +499,22 @@ class SupportTicketRating(Base):
     comment: Mapped[str] = mapped_column(String(500), nullable=True)  # Optional comment
 
     ticket = relationship("SupportTicket", back_populates="ratings")
-    user = relationship("User", back_populates="ticket_ratings")
\ No newline at end of file
+    user = relationship("User", back_populates="ticket_ratings")
+
+
+# Outgoing emails waiting to be delivered by mailer.dispatcher
+class EmailOutbox(Base):
+    __tablename__ = 'email_outbox'
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    recipient: Mapped[str] = mapped_column(String(100), nullable=False)
+    subject: Mapped[str] = mapped_column(String(255), nullable=False)
+    body: Mapped[str] = mapped_column(Text, nullable=False)
+    status: Mapped[str] = mapped_column(String(20), default='pending', nullable=False)  # e.g., 'pending', 'sending', 'sent', 'failed'
+    attempts: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    next_attempt_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now(), nullable=False)
+    last_error: Mapped[str] = mapped_column(String(500), nullable=True)
+
+    __table_args__ = (
+        Index('ix_email_outbox_status_next_attempt_at', 'status', 'next_attempt_at'),
+    )
@@ -1,118 +1,305 @@
-from database import async_session_maker
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, AsyncAttrs
+'''
+Synthetic data generator for local performance testing.
+
+Rows are generated with explicit ids and written in bulk with PostgreSQL COPY
+(or batched multi-row INSERTs with --method insert). Enrollments use the same
+set-based pipeline as the /enroll endpoint.
+
+Examples (from backend directory):
+    python populate_db.py                           # small dataset
+    python populate_db.py --scale 100 --seed 7      # 10k users, 1k courses, ~5M quiz rows
+    python populate_db.py --quiz-types multiple_choice=1,single_choice=1,short_answer=0
+
+All users get the same password (--password) so they can sign in.
+'''
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from database import engine, async_session_maker
 from models import *
+from sqlalchemy import insert, select, func, text, Table
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+from auth.utils import get_password_hash
+from user.utils import enroll_users_to_course
 from faker import Faker
-import random
+import argparse
 import asyncio
+import random
+import time
 
 
-# Initialize Faker to generate random data
-fake = Faker()
-
-def create_user():
-    phone_number = fake.phone_number()
-    phone_number = phone_number if len(phone_number) < 20 else phone_number[:20]
-    return User(
-        username=fake.user_name(),
-        email=fake.email(),
-        phone=phone_number,
-        first_name=fake.first_name(),
-        last_name=fake.last_name(),
-        password_hash=fake.password(),
-        date_of_birth=fake.date_of_birth(),
-        gender=fake.boolean(),
-    )
+@dataclass
+class GeneratorSettings:
+    scale: int = 1
+    seed: int = 42
+    users_per_scale: int = 100
+    courses_per_scale: int = 10
+    chapters_per_course: int = 10
+    lessons_per_chapter: int = 10
+    materials_per_lesson: int = 2
+    quizzes_per_lesson: int = 2
+    questions_per_quiz: int = 5
+    options_per_question: int = 4
+    quiz_types: dict = field(default_factory=lambda: {"multiple_choice": 1, "single_choice": 1, "short_answer": 1})
+    enrollments_per_user: int = 3
+    comments_per_lesson: int = 2
+    comments_per_quiz: int = 1
+    notifications_per_user: int = 5
+    password: str = "password"
+    method: str = "copy"  # 'copy' or 'insert'
+    batch_size: int = 10000
 
-def create_course(user_id):
-    return Course(
-        title=fake.bs(),
-        description=fake.text(max_nb_chars=500),
-        created_by=user_id,
-    )
 
-def create_chapter(course_id, user_id):
-    return Chapter(
-        title=fake.sentence(),
-        course_id=course_id,
-        created_by=user_id,
-    )
+class TextPool:
+    '''Pre-generated fake texts, picking from a pool is orders of magnitude faster than calling Faker per row.'''
 
-def create_lesson(chapter_id, user_id):
-    return Lesson(
-        title=fake.sentence(),
-        description=fake.text(),
-        chapter_id=chapter_id,
-        created_by=user_id,
-    )
+    def __init__(self, rng: random.Random, seed: int, size: int = 500):
+        fake = Faker()
+        fake.seed_instance(seed)
+        self.rng = rng
+        self.words = [fake.word() for _ in range(size)]
+        self.sentences = [fake.sentence()[:100] for _ in range(size)]
+        self.texts = [fake.text(max_nb_chars=250) for _ in range(size)]
+        self.first_names = [fake.first_name()[:50] for _ in range(size)]
+        self.last_names = [fake.last_name()[:50] for _ in range(size)]
 
-def create_quiz(lesson_id, user_id):
-    return Quiz(
-        title=fake.sentence(),
-        description=fake.text(),
-        lesson_id=lesson_id,
-        created_by=user_id,
-    )
+    def word(self) -> str:
+        return self.rng.choice(self.words)
 
-def create_quiz_question(quiz_id, user_id):
-    return QuizQuestion(
-        quiz_id=quiz_id,
-        title=fake.sentence(),
-        description=fake.text(),
-        question_type=random.choice(["multiple_choice", "single_choice", "short_answer"]),
-        created_by=user_id,
-    )
+    def sentence(self) -> str:
+        return self.rng.choice(self.sentences)
+
+    def text(self) -> str:
+        return self.rng.choice(self.texts)
+
+
+class BulkWriter:
+    '''Writes generated rows to a table in batches using COPY or multi-row INSERT.'''
+
+    def __init__(self, connection: AsyncConnection, method: str, batch_size: int):
+        self.connection = connection
+        self.method = method
+        self.batch_size = batch_size
+        self.counts: dict[str, int] = {}
+
+    async def write(self, table: Table, columns: list[str], rows) -> None:
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                await self._flush(table, columns, batch)
+                batch = []
+        if batch:
+            await self._flush(table, columns, batch)
+
+    async def _flush(self, table: Table, columns: list[str], batch: list[tuple]) -> None:
+        if self.method == "copy":
+            raw_connection = await self.connection.get_raw_connection()
+            await raw_connection.driver_connection.copy_records_to_table(
+                table.name, records=batch, columns=columns)
+        else:
+            await self.connection.execute(insert(table), [dict(zip(columns, row)) for row in batch])
+        self.counts[table.name] = self.counts.get(table.name, 0) + len(batch)
+
+
+async def next_id(connection: AsyncConnection, table: Table) -> int:
+    data = await connection.execute(select(func.coalesce(func.max(table.c.id), 0)))
+    return data.scalar() + 1
+
+
+async def sync_sequence(connection: AsyncConnection, table: Table) -> None:
+    await connection.execute(text(
+        f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+        f"(SELECT COALESCE(MAX(id), 0) + 1 FROM {table.name}), false)"
+    ))
+
+
+async def populate(settings: GeneratorSettings, db_engine: AsyncEngine = engine, session_maker=async_session_maker) -> dict:
+    rng = random.Random(settings.seed)
+    pool = TextPool(rng, settings.seed)
+    password_hash = get_password_hash(settings.password)
+    now = datetime.now()
+
+    user_count = settings.users_per_scale * settings.scale
+    course_count = settings.courses_per_scale * settings.scale
+    quiz_types = list(settings.quiz_types)
+    quiz_type_weights = [settings.quiz_types[quiz_type] for quiz_type in quiz_types]
+
+    async with db_engine.connect() as connection:
+        writer = BulkWriter(connection, settings.method, settings.batch_size)
+        ids = {}
+        for model in (User, Course, Chapter, Lesson, LessonMaterial, Quiz, QuizQuestion,
+                      QuizQuestionMultipleChoice, QuizQuestionMultipleChoiceOption,
+                      QuizQuestionSingleChoice, QuizQuestionSingleChoiceOption, QuizQuestionShortAnswer,
+                      Achievement):
+            ids[model] = await next_id(connection, model.__table__)
+
+        # users, every 50th is an admin (course author)
+        first_user = ids[User]
+        user_ids = range(first_user, first_user + user_count)
+        author_ids = user_ids[::50]
+
+        def users():
+            for user_id in user_ids:
+                yield (user_id, f"{pool.word()}{user_id}"[:50], f"user{user_id}@example.com", f"+{user_id:012d}",
+                       rng.choice(pool.first_names), rng.choice(pool.last_names),
+                       now.date() - timedelta(days=rng.randint(16 * 365, 60 * 365)), rng.random() < 0.5,
+                       True, password_hash, (user_id - first_user) % 50 == 0, True)
+
+        await writer.write(User.__table__, ["id", "username", "email", "phone", "first_name", "last_name",
+                                            "date_of_birth", "gender", "email_verified", "password_hash",
+                                            "is_admin", "is_active"], users())
+
+        # content hierarchy, children ids are derived from parent ids so nothing is kept in memory
+        first_course = ids[Course]
+        course_ids = range(first_course, first_course + course_count)
+        chapter_count = course_count * settings.chapters_per_course
+        lesson_count = chapter_count * settings.lessons_per_chapter
+        quiz_count = lesson_count * settings.quizzes_per_lesson
+        question_count = quiz_count * settings.questions_per_quiz
+
+        await writer.write(Course.__table__, ["id", "title", "description", "created_by"], (
+            (course_id, pool.sentence(), pool.text(), rng.choice(author_ids)) for course_id in course_ids))
+
+        await writer.write(Chapter.__table__, ["id", "title", "course_id", "created_by", "order"], (
+            (ids[Chapter] + i, pool.sentence(), first_course + i // settings.chapters_per_course,
+             rng.choice(author_ids), i % settings.chapters_per_course + 1) for i in range(chapter_count)))
+
+        await writer.write(Lesson.__table__, ["id", "title", "description", "chapter_id", "created_by", "order"], (
+            (ids[Lesson] + i, pool.sentence(), pool.text(), ids[Chapter] + i // settings.lessons_per_chapter,
+             rng.choice(author_ids), i % settings.lessons_per_chapter + 1) for i in range(lesson_count)))
+
+        await writer.write(LessonMaterial.__table__, ["id", "lesson_id", "material_type", "material_content", "created_by", "order"], (
+            (ids[LessonMaterial] + i, ids[Lesson] + i // settings.materials_per_lesson,
+             rng.choice(["text", "video", "photo"]), pool.text(), rng.choice(author_ids),
+             i % settings.materials_per_lesson + 1) for i in range(lesson_count * settings.materials_per_lesson)))
+
+        await writer.write(Quiz.__table__, ["id", "title", "description", "lesson_id", "created_by"], (
+            (ids[Quiz] + i, pool.sentence(), pool.text(), ids[Lesson] + i // settings.quizzes_per_lesson,
+             rng.choice(author_ids)) for i in range(quiz_count)))
+
+        question_types = rng.choices(quiz_types, weights=quiz_type_weights, k=question_count)
+        await writer.write(QuizQuestion.__table__, ["id", "quiz_id", "title", "description", "question_type", "created_by", "order"], (
+            (ids[QuizQuestion] + i, ids[Quiz] + i // settings.questions_per_quiz, pool.sentence(), pool.text(),
+             question_types[i], rng.choice(author_ids), i % settings.questions_per_quiz + 1) for i in range(question_count)))
+
+        # question bodies and options for each question type
+        for question_type, model, option_model, option_fk in (
+            ("multiple_choice", QuizQuestionMultipleChoice, QuizQuestionMultipleChoiceOption, "question_multiple_choice_id"),
+            ("single_choice", QuizQuestionSingleChoice, QuizQuestionSingleChoiceOption, "question_single_choice_id"),
+        ):
+            question_ids = [ids[QuizQuestion] + i for i, value in enumerate(question_types) if value == question_type]
+            first_body = ids[model]
+            await writer.write(model.__table__, ["id", "question_id", "question_title", "question_description"], (
+                (first_body + i, question_id, pool.sentence(), pool.text()) for i, question_id in enumerate(question_ids)))
+
+            def options():
+                option_id = ids[option_model]
+                for i in range(len(question_ids)):
+                    if question_type == "single_choice":
+                        correct = {rng.randrange(settings.options_per_question)}
+                    else:
+                        correct = set(rng.sample(range(settings.options_per_question), rng.randint(1, settings.options_per_question)))
+                    for option in range(settings.options_per_question):
+                        yield (option_id, first_body + i, pool.sentence(), option in correct)
+                        option_id += 1
+
+            await writer.write(option_model.__table__, ["id", option_fk, "choice_text", "is_correct"], options())
+
+        short_answer_ids = [ids[QuizQuestion] + i for i, value in enumerate(question_types) if value == "short_answer"]
+        await writer.write(QuizQuestionShortAnswer.__table__, ["id", "question_id", "question_title", "question_description", "correct_answer"], (
+            (ids[QuizQuestionShortAnswer] + i, question_id, pool.sentence(), pool.text(), pool.word())
+            for i, question_id in enumerate(short_answer_ids)))
+
+        # achievements, one rule per type and threshold
+        rules = [
+            (achievement_type, qty)
+            for achievement_type in ("lesson_completion", "chapter_completion", "course_completion", "quiz_completion")
+            for qty in (1, 5, 10, 25, 50, 100)
+        ]
+        await writer.write(Achievement.__table__, ["id", "title", "description", "type", "qty"], (
+            (ids[Achievement] + i, f"{achievement_type.replace('_', ' ').title()} x{qty}", pool.sentence(), achievement_type, qty)
+            for i, (achievement_type, qty) in enumerate(rules)))
+
+        # comments, created over the last year so feeds have realistic ordering
+        def comments(count: int, parent_first_id: int, per_parent: int):
+            for i in range(count * per_parent):
+                yield (parent_first_id + rng.randrange(count), rng.choice(user_ids), pool.text(),
+                       now - timedelta(seconds=rng.randint(0, 365 * 24 * 3600)))
+
+        await writer.write(CommentLesson.__table__, ["lesson_id", "user_id", "content", "created_at"],
+                           comments(lesson_count, ids[Lesson], settings.comments_per_lesson))
+        await writer.write(CommentQuiz.__table__, ["quiz_id", "user_id", "content", "created_at"],
+                           comments(quiz_count, ids[Quiz], settings.comments_per_quiz))
+
+        await writer.write(InAppNotification.__table__, ["user_id", "title", "content", "is_read"], (
+            (user_id, pool.sentence(), pool.text(), rng.random() < 0.5)
+            for user_id in user_ids for _ in range(settings.notifications_per_user)))
+
+        # explicit ids were used, move sequences past them
+        for table in Base.metadata.sorted_tables:
+            if "id" in table.c:
+                await sync_sequence(connection, table)
+
+        await connection.commit()
+
+    # enrollments through the set-based enrollment pipeline, one statement set per course
+    cohorts: dict[int, list[int]] = {}
+    for user_id in user_ids:
+        for course_id in rng.sample(course_ids, min(settings.enrollments_per_user, course_count)):
+            cohorts.setdefault(course_id, []).append(user_id)
+
+    async with session_maker() as session:
+        enrolled = 0
+        for course_id, cohort in cohorts.items():
+            enrolled += len(await enroll_users_to_course(course_id, cohort, session))
+    writer.counts["enrollments"] = enrolled
+
+    return writer.counts
+
+
+def parse_quiz_types(value: str) -> dict:
+    quiz_types = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        quiz_types[name.strip()] = float(weight or 1)
+    return quiz_types
+
+
+if __name__ == "__main__":
+    defaults = GeneratorSettings()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=int, default=defaults.scale, help="multiplies number of users and courses")
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--users-per-scale", type=int, default=defaults.users_per_scale)
+    parser.add_argument("--courses-per-scale", type=int, default=defaults.courses_per_scale)
+    parser.add_argument("--chapters", type=int, default=defaults.chapters_per_course, help="chapters per course")
+    parser.add_argument("--lessons", type=int, default=defaults.lessons_per_chapter, help="lessons per chapter")
+    parser.add_argument("--materials", type=int, default=defaults.materials_per_lesson, help="materials per lesson")
+    parser.add_argument("--quizzes", type=int, default=defaults.quizzes_per_lesson, help="quizzes per lesson")
+    parser.add_argument("--questions", type=int, default=defaults.questions_per_quiz, help="questions per quiz")
+    parser.add_argument("--options", type=int, default=defaults.options_per_question, help="options per choice question")
+    parser.add_argument("--quiz-types", type=parse_quiz_types, default=defaults.quiz_types,
+                        help="question type weights, e.g. multiple_choice=2,single_choice=1,short_answer=1")
+    parser.add_argument("--enrollments", type=int, default=defaults.enrollments_per_user, help="courses per user")
+    parser.add_argument("--comments", type=int, default=defaults.comments_per_lesson, help="comments per lesson")
+    parser.add_argument("--quiz-comments", type=int, default=defaults.comments_per_quiz, help="comments per quiz")
+    parser.add_argument("--notifications", type=int, default=defaults.notifications_per_user, help="notifications per user")
+    parser.add_argument("--password", default=defaults.password, help="password of every generated user")
+    parser.add_argument("--method", choices=["copy", "insert"], default=defaults.method)
+    parser.add_argument("--batch-size", type=int, default=defaults.batch_size)
+    args = parser.parse_args()
 
-def create_achievement(user_id):
-    return Achievement(
-        title=fake.word(),
-        description=fake.text(),
-        qty=random.randint(1, 100),
-        type=random.choice(["course_completion", "quiz_completion", "chapter_completion"]),
+    settings = GeneratorSettings(
+        scale=args.scale, seed=args.seed, users_per_scale=args.users_per_scale, courses_per_scale=args.courses_per_scale,
+        chapters_per_course=args.chapters, lessons_per_chapter=args.lessons, materials_per_lesson=args.materials,
+        quizzes_per_lesson=args.quizzes, questions_per_quiz=args.questions, options_per_question=args.options,
+        quiz_types=args.quiz_types, enrollments_per_user=args.enrollments, comments_per_lesson=args.comments,
+        comments_per_quiz=args.quiz_comments, notifications_per_user=args.notifications, password=args.password,
+        method=args.method, batch_size=args.batch_size
     )
 
-# Populate the database with 5 users and related data
-async def populate():
-    async with async_session_maker() as session:
-        for _ in range(5):
-            user = create_user()
-            session.add(user)
-            await session.commit()
-
-            # Create courses for the user
-            for _ in range(5):
-                course = create_course(user.id)
-                session.add(course)
-                await session.commit()
-
-                # Create chapters for the course
-                for _ in range(5):
-                    chapter = create_chapter(course.id, user.id)
-                    session.add(chapter)
-                    await session.commit()
-
-                    # Create lessons for the chapter
-                    for _ in range(5):
-                        lesson = create_lesson(chapter.id, user.id)
-                        session.add(lesson)
-                        await session.commit()
-
-                        # Create quizzes for the lesson
-                        for _ in range(5):
-                            quiz = create_quiz(lesson.id, user.id)
-                            session.add(quiz)
-                            await session.commit()
-
-                            # Create quiz questions for the quiz
-                            for _ in range(5):
-                                quiz_question = create_quiz_question(quiz.id, user.id)
-                                session.add(quiz_question)
-                                await session.commit()
-
-            # Create achievements for the user
-            for _ in range(5):
-                achievement = create_achievement(user.id)
-                session.add(achievement)
-                await session.commit()
-
-asyncio.run(populate())
-print("Database populated with 5 entries in each table.")
+    start = time.perf_counter()
+    counts = asyncio.run(populate(settings))
+    for table_name, count in counts.items():
+        print(f"{table_name:45} {count:>12,}")
+    print(f"Database populated in {time.perf_counter() - start:.1f}s")
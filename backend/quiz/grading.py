@@ -0,0 +1,84 @@
+from dataclasses import dataclass, field
+import unicodedata
+
+
+# answers are compared case-insensitively with whitespace collapsed
+def normalize_answer(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFKC", text).split()).casefold()
+
+
+@dataclass(slots=True)
+class QuestionKey:
+    # choice questions: option id -> bit, and the mask of correct options
+    option_bits: dict[int, int] = field(default_factory=dict)
+    correct_mask: int = 0
+    # short answer questions: accepted normalized answers
+    answers: frozenset[str] = frozenset()
+
+    def grade(self, option_ids: list[int], text: str | None) -> bool:
+        if self.option_bits:
+            mask = 0
+            for option_id in option_ids:
+                bit = self.option_bits.get(option_id)
+                if bit is None:
+                    return False
+                mask |= bit
+            return mask == self.correct_mask
+        return text is not None and normalize_answer(text) in self.answers
+
+
+@dataclass(slots=True)
+class QuizKey:
+    '''
+    Answer key of a quiz compiled from its questions and option tables.
+    Grading a submission is a dict lookup and a bitmask comparison per question.
+    '''
+    quiz_id: int
+    course_id: int | None
+    questions: dict[int, QuestionKey]  # question id -> key, questions without answers are left out
+
+    # ids of question rows and option bodies the key was compiled from (for invalidation)
+    question_ids: frozenset[int] = frozenset()
+    body_ids: frozenset[tuple[str, int]] = frozenset()
+
+    @classmethod
+    def compile(cls, quiz, course_id: int | None) -> "QuizKey":
+        questions, body_ids = {}, set()
+        for question in quiz.questions:
+            bodies = {
+                "multiple_choice": question.multiple_choice_options,
+                "single_choice": question.single_choice_options,
+                "short_answer": question.short_answer_options,
+            }
+            for kind, kind_bodies in bodies.items():
+                body_ids.update((kind, body.id) for body in kind_bodies)
+
+            # only bodies of the question's own type are graded, option ids of the two option tables may collide
+            key = QuestionKey()
+            if question.question_type in ("multiple_choice", "single_choice"):
+                options = [option for body in bodies[question.question_type] for option in body.options]
+                for position, option in enumerate(sorted(options, key=lambda option: option.id)):
+                    key.option_bits[option.id] = 1 << position
+                    if option.is_correct:
+                        key.correct_mask |= 1 << position
+            elif question.question_type == "short_answer":
+                key.answers = frozenset(normalize_answer(body.correct_answer) for body in bodies["short_answer"])
+
+            if key.option_bits or key.answers:
+                questions[question.id] = key
+
+        return cls(
+            quiz_id=quiz.id,
+            course_id=course_id,
+            questions=questions,
+            question_ids=frozenset(question.id for question in quiz.questions),
+            body_ids=frozenset(body_ids)
+        )
+
+    # answers: question id -> (option ids, text), returns question id -> correct
+    def grade(self, answers: dict[int, tuple[list[int], str | None]]) -> dict[int, bool]:
+        results = {}
+        for question_id, key in self.questions.items():
+            option_ids, text = answers.get(question_id, ([], None))
+            results[question_id] = key.grade(option_ids, text)
+        return results
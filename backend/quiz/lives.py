@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta
+from fastapi import HTTPException, status
+from sqlalchemy import select, func, extract, case, cast, Integer
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from auth.schemas import CurrentUser
+from models import UserQuizLife
+from quiz.schemas import QuizLives
+from utils import internal_error
+from config import config
+
+
+LIFE_PERIOD = timedelta(minutes=config.QUIZ_LIFE_REGEN_MINUTES)
+
+
+######## LAZY REGENERATION #########
+# a row stores the lives left after the last spend and the moment they started regenerating,
+# the current value is derived from the clock, so idle users cost nothing and no job rewrites rows
+
+# lives at `now` and when the next one regenerates (None when full)
+def current_lives(lives: int, last_spent_at: datetime, now: datetime) -> tuple[int, datetime | None]:
+    if lives < config.QUIZ_MAX_LIVES:
+        regenerated = max((now - last_spent_at) // LIFE_PERIOD, 0)
+        lives += regenerated
+        if lives < config.QUIZ_MAX_LIVES:
+            return lives, last_spent_at + (regenerated + 1) * LIFE_PERIOD
+    return config.QUIZ_MAX_LIVES, None
+
+
+async def get_lives(user: CurrentUser, session: AsyncSession, now: datetime | None = None) -> QuizLives:
+    now = now or datetime.now()
+    try:
+        data = await session.execute(
+            select(UserQuizLife.lives, UserQuizLife.last_spent_at).filter(UserQuizLife.user_id == user.id)
+        )
+    except SQLAlchemyError:
+        raise internal_error
+
+    row = data.first()
+    # no row yet - never spent a life
+    lives, next_life_at = current_lives(row.lives, row.last_spent_at, now) if row else (config.QUIZ_MAX_LIVES, None)
+    return QuizLives(lives=lives, max_lives=config.QUIZ_MAX_LIVES, next_life_at=next_life_at)
+
+
+# spend `count` lives in one upsert, regeneration up to `now` is applied in the same statement.
+# returns lives left, None if fewer than `count` lives were left (nothing is written then)
+async def spend_lives(session: AsyncSession, user_id: int, count: int, now: datetime) -> int | None:
+    max_lives = config.QUIZ_MAX_LIVES
+    if count > max_lives:
+        return None
+    regenerated = func.greatest(
+        cast(func.floor(extract("epoch", now - UserQuizLife.last_spent_at) / LIFE_PERIOD.total_seconds()), Integer), 0
+    )
+    lives = func.least(UserQuizLife.lives + regenerated, max_lives)
+
+    stmt = insert(UserQuizLife).values(user_id=user_id, lives=max_lives - count, last_spent_at=now)
+    data = await session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[UserQuizLife.user_id],
+            set_={
+                "lives": lives - count,
+                # full lives start regenerating now, otherwise the part of the period already passed is kept
+                "last_spent_at": case(
+                    (lives >= max_lives, now),
+                    else_=UserQuizLife.last_spent_at + regenerated * LIFE_PERIOD
+                )
+            },
+            where=lives >= count
+        ).returning(UserQuizLife.lives)
+    )
+    row = data.first()
+    return None if row is None else row.lives
+
+
+def out_of_lives(next_life_at: datetime | None) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_403_FORBIDDEN,
+        detail={
+            "success": False,
+            "message": "No quiz lives left." + (f" Next life at {next_life_at.isoformat()}." if next_life_at else ""),
+            "data": None
+        }
+    )
+####################################
@@ -0,0 +1,47 @@
+from fastapi import APIRouter, Body, Depends, Response
+from typing import List
+from auth.utils import get_current_user
+from auth.schemas import CurrentUser
+from database import SessionDep, ReadSessionDep
+from quiz.schemas import QuizSubmission, QuestionAnswer
+from quiz.utils import get_quiz, grade_submissions
+from quiz.lives import get_lives
+from config import config
+from utils import envelope
+
+router = APIRouter(
+    prefix="/quiz",
+    tags=["quizzes"]
+)
+
+
+# registered before /{quiz_id}, read from the primary so a life spent a moment ago is seen
+@router.get("/lives")
+async def lives(session: SessionDep, response: Response, user: CurrentUser = Depends(get_current_user)):
+    quiz_lives = await get_lives(user, session)
+    return envelope("Quiz lives", quiz_lives, response)
+
+
+# questions and options without answers (cached per quiz)
+@router.get("/{quiz_id}")
+async def quiz(quiz_id: int, session: ReadSessionDep, response: Response, user: CurrentUser = Depends(get_current_user)):
+    payload = await get_quiz(quiz_id, session)
+    return envelope(f"Quiz with id:{quiz_id}", payload, response)
+
+
+@router.post("/{quiz_id}/submit")
+async def submit(quiz_id: int, answers: List[QuestionAnswer], session: SessionDep, response: Response,
+                 user: CurrentUser = Depends(get_current_user)):
+    results = await grade_submissions(user, [QuizSubmission(quiz_id=quiz_id, answers=answers)], session)
+    return envelope(f"Result for quiz with id:{quiz_id}", results[0], response)
+
+
+# several quizzes graded in one request (e.g. answers collected offline), graded in order until
+# failed submissions have used up the lives, quizzes after that are skipped and left out of the results
+@router.post("/submit_many")
+async def submit_many(session: SessionDep, response: Response, user: CurrentUser = Depends(get_current_user),
+                      submissions: List[QuizSubmission] = Body(min_length=1, max_length=config.QUIZ_MAX_BATCH)):
+    results = await grade_submissions(user, submissions, session)
+    skipped = len({submission.quiz_id for submission in submissions}) - len(results)
+    message = f"Results for {len(results)} quizzes" + (f", {skipped} skipped: no quiz lives left" if skipped else "")
+    return envelope(message, results, response)
@@ -0,0 +1,73 @@
+from pydantic import BaseModel, Field
+from typing import List
+from datetime import datetime
+
+
+class QuestionAnswer(BaseModel):
+    question_id: int
+    option_ids: List[int] = Field(default=[], description="selected options of a choice question")
+    text: str | None = Field(default=None, max_length=512, description="answer to a short answer question")
+
+
+class QuizSubmission(BaseModel):
+    quiz_id: int
+    answers: List[QuestionAnswer] = []
+
+
+class QuestionResult(BaseModel):
+    question_id: int
+    is_correct: bool
+
+
+class QuizResult(BaseModel):
+    quiz_id: int
+    score: float  # score of this submission
+    passed: bool
+    best_score: float  # best score so far (stored on user_quizzes)
+    is_completed: bool
+    newly_completed: bool = False
+    questions: List[QuestionResult] = []
+
+
+# quiz as shown to learners, is_correct and correct_answer are never part of it
+class QuizOption(BaseModel):
+    id: int
+    choice_text: str
+
+
+class QuizChoiceBody(BaseModel):
+    id: int
+    question_title: str
+    question_description: str | None
+    options: List[QuizOption] = []
+
+
+class QuizShortAnswerBody(BaseModel):
+    id: int
+    question_title: str
+    question_description: str | None
+
+
+class QuizQuestionPayload(BaseModel):
+    id: int
+    title: str
+    description: str | None
+    question_type: str
+    order: int | None
+    multiple_choice: List[QuizChoiceBody] = []
+    single_choice: List[QuizChoiceBody] = []
+    short_answer: List[QuizShortAnswerBody] = []
+
+
+class QuizPayload(BaseModel):
+    id: int
+    title: str
+    description: str | None
+    lesson_id: int
+    questions: List[QuizQuestionPayload] = []
+
+
+class QuizLives(BaseModel):
+    lives: int
+    max_lives: int
+    next_life_at: datetime | None = None  # None when lives are full
@@ -0,0 +1,386 @@
+from datetime import datetime
+from fastapi import HTTPException, status
+from pydantic_core import to_json
+from sqlalchemy import select, update, values, column, func, tuple_, event, inspect, Integer, Float, Boolean
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
+from auth.schemas import CurrentUser
+from models import (
+    Quiz, QuizQuestion, QuizQuestionMultipleChoice, QuizQuestionMultipleChoiceOption,
+    QuizQuestionSingleChoice, QuizQuestionSingleChoiceOption, QuizQuestionShortAnswer,
+    UserQuiz, Lesson, Chapter
+    )
+from quiz.grading import QuizKey
+from quiz.lives import get_lives, spend_lives, out_of_lives
+from quiz.schemas import (
+    QuizSubmission, QuizResult, QuestionResult,
+    QuizPayload, QuizQuestionPayload, QuizChoiceBody, QuizShortAnswerBody, QuizOption
+    )
+from leaderboard.utils import XPAward, award_xp
+from achievements.utils import record_achievement_events
+from cache import TTLCache
+from metrics import Counter
+from utils import internal_error, RawJSON
+from config import config
+
+
+quiz_cache_lookups = Counter("quiz_cache_lookups_total", "Quiz cache lookups by cache and result.", ("cache", "result"))
+quiz_submissions = Counter("quiz_submissions_total", "Graded quiz submissions by result.", ("result",))
+
+
+######## QUIZ TREE LOADER #########
+# quiz -> questions -> option bodies -> options in a fixed number of SELECT ... IN queries for any number of quizzes
+QUIZ_TREE = selectinload(Quiz.questions).options(
+    selectinload(QuizQuestion.multiple_choice_options).selectinload(QuizQuestionMultipleChoice.options),
+    selectinload(QuizQuestion.single_choice_options).selectinload(QuizQuestionSingleChoice.options),
+    selectinload(QuizQuestion.short_answer_options)
+)
+
+
+# quiz id -> (quiz with its whole tree, course id)
+async def load_quizzes(quiz_ids: set[int], session: AsyncSession) -> dict[int, tuple[Quiz, int]]:
+    if not quiz_ids:
+        return {}
+
+    data = await session.execute(
+        select(Quiz, Chapter.course_id).join(
+            Lesson, Lesson.id == Quiz.lesson_id
+        ).join(
+            Chapter, Chapter.id == Lesson.chapter_id
+        ).filter(Quiz.id.in_(quiz_ids)).options(QUIZ_TREE)
+    )
+    return {quiz.id: (quiz, course_id) for quiz, course_id in data.all()}
+
+
+def quizzes_not_found(quiz_ids) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail={
+            "success": False,
+            "message": f"Quizzes with ids:{sorted(quiz_ids)} were not found.",
+            "data": None
+        }
+    )
+
+
+# (kind, id) of every option body of the quiz tree
+def quiz_body_ids(quiz: Quiz) -> list[tuple[str, int]]:
+    return [
+        (kind, body.id)
+        for question in quiz.questions
+        for kind, bodies in (("multiple_choice", question.multiple_choice_options),
+                             ("single_choice", question.single_choice_options),
+                             ("short_answer", question.short_answer_options))
+        for body in bodies
+    ]
+
+
+def choice_body(body) -> QuizChoiceBody:
+    return QuizChoiceBody(
+        id=body.id, question_title=body.question_title, question_description=body.question_description,
+        options=[QuizOption(id=option.id, choice_text=option.choice_text) for option in body.options]
+    )
+
+
+# quiz tree without answers, rendered to JSON once
+def render_quiz_payload(quiz: Quiz) -> RawJSON:
+    payload = QuizPayload(
+        id=quiz.id, title=quiz.title, description=quiz.description, lesson_id=quiz.lesson_id,
+        questions=[
+            QuizQuestionPayload(
+                id=question.id, title=question.title, description=question.description,
+                question_type=question.question_type, order=question.order,
+                multiple_choice=[choice_body(body) for body in question.multiple_choice_options],
+                single_choice=[choice_body(body) for body in question.single_choice_options],
+                short_answer=[
+                    QuizShortAnswerBody(id=body.id, question_title=body.question_title,
+                                        question_description=body.question_description)
+                    for body in question.short_answer_options
+                ]
+            )
+            for question in quiz.questions
+        ]
+    )
+    return RawJSON(to_json(payload))
+###################################
+
+
+class QuizCache:
+    '''
+    Per-quiz caches of data compiled from the quiz tree: answer keys and answer-free payloads.
+    Answer keys are only compiled from primary loads (grading), a key miss fills both caches.
+    Payloads are served from replica loads, which never fill the key cache: a lagging replica
+    could otherwise put back an answer key that was just fixed.
+
+    Entries are dropped when the quiz, one of its questions, option bodies or options is written
+    in this process, the ids of question rows and option bodies of cached quizzes are indexed
+    so writes of any part of the tree can be mapped back to the quiz.
+    Entries expire after ttl seconds so writes made by other workers are picked up.
+    Index entries of invalidated quizzes are dropped right away, those of evicted or expired ones
+    once the index holds twice as many quizzes as both caches can.
+    '''
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.keys = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.payloads = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._question_quiz: dict[int, int] = {}
+        self._body_quiz: dict[tuple[str, int], int] = {}
+        # quiz id -> (question ids, body ids) it was indexed with
+        self._indexed: dict[int, tuple[frozenset, frozenset]] = {}
+
+    def index(self, quiz_id: int, question_ids, body_ids) -> None:
+        self.unindex(quiz_id)
+        self._indexed[quiz_id] = (frozenset(question_ids), frozenset(body_ids))
+        for question_id in question_ids:
+            self._question_quiz[question_id] = quiz_id
+        for body_id in body_ids:
+            self._body_quiz[body_id] = quiz_id
+
+        if len(self._indexed) > 2 * (self.keys.maxsize + self.payloads.maxsize):
+            for cached_quiz_id in list(self._indexed):
+                if cached_quiz_id not in self.keys and cached_quiz_id not in self.payloads:
+                    self.unindex(cached_quiz_id)
+
+    def unindex(self, quiz_id: int) -> None:
+        question_ids, body_ids = self._indexed.pop(quiz_id, ((), ()))
+        # a question or body may have moved to a quiz indexed later
+        for question_id in question_ids:
+            if self._question_quiz.get(question_id) == quiz_id:
+                del self._question_quiz[question_id]
+        for body_id in body_ids:
+            if self._body_quiz.get(body_id) == quiz_id:
+                del self._body_quiz[body_id]
+
+    def quiz_of_question(self, question_id: int) -> int | None:
+        return self._question_quiz.get(question_id)
+
+    def quiz_of_body(self, kind: str, body_id: int) -> int | None:
+        return self._body_quiz.get((kind, body_id))
+
+    def invalidate(self, *quiz_ids: int) -> None:
+        self.keys.delete(*quiz_ids)
+        self.payloads.delete(*quiz_ids)
+        for quiz_id in quiz_ids:
+            self.unindex(quiz_id)
+
+    # compile everything cached for a quiz tree loaded from the primary
+    def store(self, quiz: Quiz, course_id: int) -> QuizKey:
+        key = QuizKey.compile(quiz, course_id)
+        self.keys.set(quiz.id, key)
+        self.payloads.set(quiz.id, render_quiz_payload(quiz))
+        self.index(quiz.id, key.question_ids, key.body_ids)
+        return key
+
+    # payload of a quiz tree loaded from any session (replica included)
+    def store_payload(self, quiz: Quiz) -> RawJSON:
+        payload = render_quiz_payload(quiz)
+        self.payloads.set(quiz.id, payload)
+        key = self.keys.get(quiz.id)
+        if key is None:
+            self.index(quiz.id, (question.id for question in quiz.questions), quiz_body_ids(quiz))
+        return payload
+
+    # compiled answer keys of the quizzes, missing ones are loaded together (session must be on the primary)
+    async def get_keys(self, quiz_ids: set[int], session: AsyncSession) -> dict[int, QuizKey]:
+        keys = {}
+        for quiz_id in quiz_ids:
+            key = self.keys.get(quiz_id)
+            if key is not None:
+                keys[quiz_id] = key
+        quiz_cache_lookups.inc("keys", "hit", amount=len(keys))
+
+        missing = quiz_ids - keys.keys()
+        if missing:
+            quiz_cache_lookups.inc("keys", "miss", amount=len(missing))
+            for quiz_id, (quiz, course_id) in (await load_quizzes(missing, session)).items():
+                keys[quiz_id] = self.store(quiz, course_id)
+        return keys
+
+    async def get_payload(self, quiz_id: int, session: AsyncSession) -> RawJSON | None:
+        payload = self.payloads.get(quiz_id)
+        if payload is not None:
+            quiz_cache_lookups.inc("payloads", "hit")
+            return payload
+
+        quiz_cache_lookups.inc("payloads", "miss")
+        loaded = await load_quizzes({quiz_id}, session)
+        if quiz_id not in loaded:
+            return None
+        quiz, _ = loaded[quiz_id]
+        return self.store_payload(quiz)
+
+
+quiz_cache = QuizCache(maxsize=config.QUIZ_CACHE_SIZE, ttl=config.QUIZ_CACHE_TTL)
+
+
+######## CACHE INVALIDATION ON ORM WRITES #########
+BODY_KINDS = {
+    QuizQuestionMultipleChoice: "multiple_choice",
+    QuizQuestionSingleChoice: "single_choice",
+    QuizQuestionShortAnswer: "short_answer",
+}
+OPTION_BODIES = {
+    QuizQuestionMultipleChoiceOption: ("multiple_choice", "question_multiple_choice_id"),
+    QuizQuestionSingleChoiceOption: ("single_choice", "question_single_choice_id"),
+}
+
+
+# collect quizzes touched by the flush, drop their cache entries once the transaction is committed
+@event.listens_for(Session, "after_flush")
+def collect_quiz_ids(session, flush_context):
+    quiz_ids = session.info.setdefault("quiz_ids", set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, Quiz):
+            quiz_ids.add(obj.id)
+        elif isinstance(obj, QuizQuestion):
+            quiz_ids.add(obj.quiz_id)
+            # question moved to another quiz
+            quiz_ids.update(inspect(obj).attrs.quiz_id.history.deleted)
+        elif type(obj) in BODY_KINDS:
+            quiz_ids.add(quiz_cache.quiz_of_question(obj.question_id))
+            quiz_ids.add(quiz_cache.quiz_of_body(BODY_KINDS[type(obj)], obj.id))
+        elif type(obj) in OPTION_BODIES:
+            kind, body_attribute = OPTION_BODIES[type(obj)]
+            quiz_ids.add(quiz_cache.quiz_of_body(kind, getattr(obj, body_attribute)))
+    quiz_ids.discard(None)
+
+
+@event.listens_for(Session, "after_commit")
+def invalidate_quiz_ids(session):
+    quiz_ids = session.info.pop("quiz_ids", None)
+    if quiz_ids:
+        quiz_cache.invalidate(*quiz_ids)
+
+
+@event.listens_for(Session, "after_rollback")
+def discard_quiz_ids(session):
+    session.info.pop("quiz_ids", None)
+###################################################
+
+
+# quiz for learners: questions and options without answers
+async def get_quiz(quiz_id: int, session: AsyncSession) -> RawJSON:
+    try:
+        payload = await quiz_cache.get_payload(quiz_id, session)
+    except SQLAlchemyError:
+        raise internal_error
+    if payload is None:
+        raise quizzes_not_found({quiz_id})
+    return payload
+
+
+######## GRADING #########
+# graded (user_id, quiz_id, score, passed) rows -> user_quizzes in one statement.
+# best score is kept and completion is never revoked, previous completion is read from a
+# locking CTE (it sees the latest committed row) so newly completed quizzes are known without a second query
+async def save_quiz_results(session: AsyncSession, graded: list[tuple[int, int, float, bool]]) -> list:
+    graded_values = values(
+        column("user_id", Integer), column("quiz_id", Integer), column("score", Float), column("passed", Boolean),
+        name="graded"
+    ).data(graded)
+    previous = select(UserQuiz.id, UserQuiz.is_completed).filter(
+        tuple_(UserQuiz.user_id, UserQuiz.quiz_id).in_([(user_id, quiz_id) for user_id, quiz_id, _, _ in graded])
+    ).order_by(UserQuiz.id).with_for_update().cte("previous")
+
+    data = await session.execute(
+        update(UserQuiz).filter(
+            UserQuiz.id == previous.c.id,
+            UserQuiz.user_id == graded_values.c.user_id,
+            UserQuiz.quiz_id == graded_values.c.quiz_id
+        ).values(
+            score=func.greatest(UserQuiz.score, graded_values.c.score),
+            is_completed=UserQuiz.is_completed | graded_values.c.passed
+        ).returning(
+            UserQuiz.user_id, UserQuiz.quiz_id, UserQuiz.score, UserQuiz.is_completed,
+            previous.c.is_completed.label("was_completed")
+        ).execution_options(synchronize_session=False)
+    )
+    return data.all()
+
+
+# grade submissions of the user (several quizzes at once), store results, spend lives, award xp and achievements.
+# returns results of the graded submissions, the ones skipped for lack of lives are left out
+async def grade_submissions(user: CurrentUser, submissions: list[QuizSubmission], session: AsyncSession) -> list[QuizResult]:
+    # the same quiz submitted twice in one batch keeps the last submission
+    submissions = list({submission.quiz_id: submission for submission in submissions}.values())
+    quiz_ids = {submission.quiz_id for submission in submissions}
+
+    now = datetime.now()
+    try:
+        keys = await quiz_cache.get_keys(quiz_ids, session)
+    except SQLAlchemyError:
+        raise internal_error
+    lives = await get_lives(user, session, now)
+    if quiz_ids - keys.keys():
+        raise quizzes_not_found(quiz_ids - keys.keys())
+    # nothing to grade, such a quiz can be neither passed nor failed
+    ungradable = sorted(quiz_id for quiz_id, key in keys.items() if not key.questions)
+    if ungradable:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail={
+                "success": False,
+                "message": f"Quizzes with ids:{ungradable} have no gradable questions.",
+                "data": None
+            }
+        )
+    if not lives.lives:
+        raise out_of_lives(lives.next_life_at)
+
+    # submissions are graded in order, every failed one spends a life. Once the lives are used up the rest
+    # of the batch is skipped (neither graded nor stored), so no result is returned without a life to pay for it
+    results, graded, failed = {}, [], 0
+    for submission in submissions:
+        if failed == lives.lives:
+            break
+        key = keys[submission.quiz_id]
+        answers = {answer.question_id: (answer.option_ids, answer.text) for answer in submission.answers}
+        correct = key.grade(answers)
+        score = round(sum(correct.values()) * 100.0 / len(correct), 2)
+        passed = score >= config.QUIZ_PASS_SCORE
+        quiz_submissions.inc("passed" if passed else "failed")
+        results[submission.quiz_id] = QuizResult(
+            quiz_id=submission.quiz_id, score=score, passed=passed, best_score=score, is_completed=passed,
+            questions=[QuestionResult(question_id=question_id, is_correct=is_correct) for question_id, is_correct in correct.items()]
+        )
+        graded.append((user.id, submission.quiz_id, score, passed))
+        failed += not passed
+
+    try:
+        rows = await save_quiz_results(session, graded)
+        if len(rows) < len(graded):
+            await session.rollback()
+            not_enrolled = results.keys() - {row.quiz_id for row in rows}
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail={
+                    "success": False,
+                    "message": f"User is not enrolled to the courses of quizzes with ids:{sorted(not_enrolled)}.",
+                    "data": None
+                }
+            )
+
+        # every failed submission spends a life, lives spent concurrently may have run out meanwhile
+        if failed and await spend_lives(session, user.id, failed, now) is None:
+            await session.rollback()
+            raise out_of_lives(None)
+
+        completed = []
+        for row in rows:
+            result = results[row.quiz_id]
+            result.best_score, result.is_completed = row.score, row.is_completed
+            result.newly_completed = row.is_completed and not row.was_completed
+            if result.newly_completed:
+                completed.append(row.quiz_id)
+
+        await award_xp(session, [
+            XPAward(user.id, config.XP_QUIZ_COMPLETED, "quiz_completion", keys[quiz_id].course_id) for quiz_id in completed
+        ])
+        await record_achievement_events(session, [(user.id, "quiz_completion", len(completed))])
+        await session.commit()
+    except SQLAlchemyError:
+        raise internal_error
+
+    return [results[submission.quiz_id] for submission in submissions if submission.quiz_id in results]
+##########################
@@ -0,0 +1,278 @@
+from dataclasses import dataclass, field
+from sqlalchemy import select, update, tuple_, func, case, and_
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import async_session_maker
+from models import UserLesson, UserChapter, UserCourse, Lesson, Chapter
+from leaderboard.utils import XPAward, award_xp
+from achievements.utils import record_achievement_events
+from metrics import Counter, Gauge, register_collector
+from config import config
+import asyncio
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+lesson_views = Counter("lesson_views_total", "Lesson views recorded (before coalescing).")
+lesson_view_flushes = Counter("lesson_view_flushes_total", "Lesson view flushes by result.", ("result",))
+lesson_views_completed = Counter("lesson_views_completed_total", "User lessons marked completed by flushes.")
+lesson_views_pending = Gauge("lesson_views_pending", "Lesson views waiting to be written.")
+
+
+@dataclass
+class CompletionChanges:
+    # (user_id, lesson_id/chapter_id/course_id) that became completed in this transaction
+    lessons: list[tuple[int, int]] = field(default_factory=list)
+    chapters: list[tuple[int, int]] = field(default_factory=list)
+    courses: list[tuple[int, int]] = field(default_factory=list)
+
+
+# percentage of completed children, capped at 100 (totals are taken at enrollment)
+def progress_percentage(completed, total):
+    return case((total <= 0, 0.0), (completed >= total, 100.0), else_=completed * 100.0 / total)
+
+
+def all_completed(completed, total):
+    return and_(total > 0, completed >= total)
+
+
+######## INCREMENTAL ROLL-UP #########
+# lesson completions -> user_chapters counters -> user_courses counters
+# each level is one UPDATE ... FROM (grouped deltas), counters are incremented in place so
+# concurrent roll-ups of the same row serialize on the row lock instead of overwriting each other
+
+# add completed lessons (user_lessons ids) to chapter counters, returns (id, user_id, chapter_id) of completed chapters
+async def roll_up_chapters(session: AsyncSession, user_lesson_ids: list[int]) -> list:
+    if not user_lesson_ids:
+        return []
+
+    deltas = select(
+        UserLesson.user_id, Lesson.chapter_id, func.count().label("completed")
+    ).join(Lesson, Lesson.id == UserLesson.lesson_id).filter(
+        UserLesson.id.in_(user_lesson_ids)
+    ).group_by(UserLesson.user_id, Lesson.chapter_id).subquery("deltas")
+
+    lesson_completed = UserChapter.lesson_completed + deltas.c.completed
+    data = await session.execute(
+        update(UserChapter).filter(
+            UserChapter.user_id == deltas.c.user_id,
+            UserChapter.chapter_id == deltas.c.chapter_id
+        ).values(
+            lesson_completed=lesson_completed,
+            progress=progress_percentage(lesson_completed, UserChapter.lesson_total),
+            is_completed=all_completed(lesson_completed, UserChapter.lesson_total)
+        ).returning(
+            UserChapter.id, UserChapter.user_id, UserChapter.chapter_id, UserChapter.is_completed,
+            # RETURNING sees new values, completed before the update if the old counter already reached the total
+            all_completed(UserChapter.lesson_completed - deltas.c.completed, UserChapter.lesson_total).label("was_completed")
+        ).execution_options(synchronize_session=False)
+    )
+    return [row for row in data.all() if row.is_completed and not row.was_completed]
+
+
+# add completed chapters (user_chapters ids) to course counters, returns (id, user_id, course_id) of completed courses
+async def roll_up_courses(session: AsyncSession, user_chapter_ids: list[int]) -> list:
+    if not user_chapter_ids:
+        return []
+
+    deltas = select(
+        UserChapter.user_id, Chapter.course_id, func.count().label("completed")
+    ).join(Chapter, Chapter.id == UserChapter.chapter_id).filter(
+        UserChapter.id.in_(user_chapter_ids)
+    ).group_by(UserChapter.user_id, Chapter.course_id).subquery("deltas")
+
+    chapter_completed = UserCourse.chapter_completed + deltas.c.completed
+    data = await session.execute(
+        update(UserCourse).filter(
+            UserCourse.user_id == deltas.c.user_id,
+            UserCourse.course_id == deltas.c.course_id
+        ).values(
+            chapter_completed=chapter_completed,
+            progress=progress_percentage(chapter_completed, UserCourse.chapter_total),
+            is_completed=all_completed(chapter_completed, UserCourse.chapter_total)
+        ).returning(
+            UserCourse.id, UserCourse.user_id, UserCourse.course_id, UserCourse.is_completed,
+            all_completed(UserCourse.chapter_completed - deltas.c.completed, UserCourse.chapter_total).label("was_completed")
+        ).execution_options(synchronize_session=False)
+    )
+    return [row for row in data.all() if row.is_completed and not row.was_completed]
+
+
+# propagate newly completed lessons (rows with id, user_id, lesson_id) up to chapters and courses
+async def apply_lesson_completions(session: AsyncSession, completed_lessons: list) -> CompletionChanges:
+    chapters = await roll_up_chapters(session, [row.id for row in completed_lessons])
+    courses = await roll_up_courses(session, [row.id for row in chapters])
+    return CompletionChanges(
+        lessons=[(row.user_id, row.lesson_id) for row in completed_lessons],
+        chapters=[(row.user_id, row.chapter_id) for row in chapters],
+        courses=[(row.user_id, row.course_id) for row in courses]
+    )
+
+
+# xp for everything that became completed, credited to the course it belongs to (two lookups per batch)
+async def award_completion_xp(session: AsyncSession, changes: CompletionChanges) -> None:
+    lesson_courses, chapter_courses = {}, {}
+    if changes.lessons:
+        data = await session.execute(
+            select(Lesson.id, Chapter.course_id).join(Chapter, Chapter.id == Lesson.chapter_id).filter(
+                Lesson.id.in_({lesson_id for _, lesson_id in changes.lessons})
+            )
+        )
+        lesson_courses = dict(data.all())
+    if changes.chapters:
+        data = await session.execute(
+            select(Chapter.id, Chapter.course_id).filter(Chapter.id.in_({chapter_id for _, chapter_id in changes.chapters}))
+        )
+        chapter_courses = dict(data.all())
+
+    await award_xp(session, [
+        *(XPAward(user_id, config.XP_LESSON_COMPLETED, "lesson_completion", lesson_courses.get(lesson_id))
+          for user_id, lesson_id in changes.lessons),
+        *(XPAward(user_id, config.XP_CHAPTER_COMPLETED, "chapter_completion", chapter_courses.get(chapter_id))
+          for user_id, chapter_id in changes.chapters),
+        *(XPAward(user_id, config.XP_COURSE_COMPLETED, "course_completion", course_id)
+          for user_id, course_id in changes.courses),
+    ])
+
+
+# completions as achievement events
+async def record_completion_achievements(session: AsyncSession, changes: CompletionChanges) -> None:
+    await record_achievement_events(session, [
+        *((user_id, "lesson_completion", 1) for user_id, _ in changes.lessons),
+        *((user_id, "chapter_completion", 1) for user_id, _ in changes.chapters),
+        *((user_id, "course_completion", 1) for user_id, _ in changes.courses),
+    ])
+
+
+class LessonViewRecorder:
+    '''
+    Write-behind recorder for "lesson viewed" events.
+
+    Views are kept in memory as (user_id, lesson_id) pairs, so repeated views of a lesson are written once.
+    A background task writes them with batched UPDATE statements every flush_interval seconds,
+    or earlier once flush_size views are pending. Failed batches are put back and retried,
+    stop() flushes everything that is left, so graceful shutdowns do not lose views.
+    Pending views are per process, is_pending() lets reads of this process see them before they are written.
+    '''
+
+    def __init__(self, flush_interval: float, flush_size: int, session_maker=async_session_maker):
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.session_maker = session_maker
+        self._pending: set[tuple[int, int]] = set()
+        self._flushing: set[tuple[int, int]] = set()
+        self._wakeup = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+        self._stopping = False
+
+    def start(self) -> None:
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        self._stopping = True
+        self._wakeup.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        # whatever is left (including batches that failed during the last loop)
+        while self._pending:
+            try:
+                flushed = await self.flush()
+            except Exception:
+                logger.exception("lesson view flush failed unexpectedly")
+                flushed = False
+            if not flushed:
+                logger.error("lesson views lost on shutdown: %d", len(self._pending))
+                break
+
+    def record(self, user_id: int, lesson_id: int) -> None:
+        lesson_views.inc()
+        self._pending.add((user_id, lesson_id))
+        if len(self._pending) >= self.flush_size:
+            self._wakeup.set()
+
+    def is_pending(self, user_id: int, lesson_id: int) -> bool:
+        key = (user_id, lesson_id)
+        return key in self._pending or key in self._flushing
+
+    def pending_count(self) -> int:
+        return len(self._pending) + len(self._flushing)
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                # keep the loop alive, the views were put back and are retried on the next flush
+                logger.exception("lesson view flush failed unexpectedly")
+
+    # write all pending views, returns False if a batch failed (it is kept for the next flush)
+    async def flush(self) -> bool:
+        async with self._lock:
+            if not self._pending:
+                return True
+
+            self._flushing, self._pending = self._pending, set()
+            views = list(self._flushing)
+            success = True
+            written = 0
+            try:
+                for start in range(0, len(views), self.flush_size):
+                    batch = views[start:start + self.flush_size]
+                    try:
+                        async with self.session_maker() as session:
+                            await self.write(session, batch)
+                            await session.commit()
+                        lesson_view_flushes.inc("success")
+                    except (SQLAlchemyError, OSError) as e:
+                        logger.warning("lesson view flush failed, %d views will be retried: %s", len(batch), e)
+                        lesson_view_flushes.inc("error")
+                        self._pending.update(batch)
+                        success = False
+                    written = start + len(batch)
+            finally:
+                # an unexpected error leaves the failing batch and the ones after it for the next flush
+                if written < len(views):
+                    lesson_view_flushes.inc("error")
+                    self._pending.update(views[written:])
+                self._flushing = set()
+            return success
+
+    # mark viewed lessons completed, roll the change up to chapter and course progress, award xp and achievements
+    async def write(self, session: AsyncSession, views: list[tuple[int, int]]) -> CompletionChanges:
+        data = await session.execute(
+            update(UserLesson).filter(
+                tuple_(UserLesson.user_id, UserLesson.lesson_id).in_(views),
+                UserLesson.is_completed.is_(False)
+            ).values(is_completed=True).returning(
+                UserLesson.id, UserLesson.user_id, UserLesson.lesson_id
+            ).execution_options(synchronize_session=False)
+        )
+        completed = data.all()
+        lesson_views_completed.inc(amount=len(completed))
+        changes = await apply_lesson_completions(session, completed)
+        await award_completion_xp(session, changes)
+        await record_completion_achievements(session, changes)
+        return changes
+
+
+lesson_view_recorder = LessonViewRecorder(
+    flush_interval=config.LESSON_VIEW_FLUSH_INTERVAL,
+    flush_size=config.LESSON_VIEW_FLUSH_SIZE
+)
+
+
+def collect_lesson_view_metrics() -> None:
+    lesson_views_pending.set(lesson_view_recorder.pending_count())
+
+
+register_collector(collect_lesson_view_metrics)
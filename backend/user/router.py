@@ -1,14 +1,19 @@
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from typing import List
 from sqlalchemy.exc import SQLAlchemyError
-from auth.utils import get_user_by_username
+from auth.utils import get_current_user
+from auth.schemas import CurrentUser
 from models import User, Course, UserCourse, UserChapter, UserLesson, UserQuiz, Chapter, Lesson
 from sqlalchemy import select
 from sqlalchemy.orm import selectinload, load_only, with_loader_criteria
-from database import SessionDep
+from database import SessionDep, ReadSessionDep
 from user.utils import (
     get_course_list_progress, get_my_course_list, get_chapters_progress,
-    get_lessons_progress, get_lesson, enroll_to_course
+    get_lessons_progress, get_lesson, enroll_to_course, enroll_users_to_course,
+    get_lesson_comments, get_quiz_comments
     )
+from config import config
+from utils import envelope
 
 router = APIRouter(
     prefix="/user",
@@ -17,79 +22,78 @@ router = APIRouter(
 
 
 @router.get("/courses")
-async def courses(session: SessionDep, user = Depends(get_user_by_username)):
-    courses = await get_course_list_progress(user, session)
-    return {
-        "details":{
-            "success": True,
-            "message": "The list of courses",
-            "data": courses
-        }
-    }
+async def courses(session: SessionDep, response: Response, user: CurrentUser = Depends(get_current_user),
+                  after_id: int | None = None, limit: int | None = Query(default=None, gt=0, le=500)):
+    courses = await get_course_list_progress(user, session, after_id, limit)
+    return envelope("The list of courses", courses, response)
 
 @router.get("/my_courses")
-async def my_courses(session: SessionDep, user = Depends(get_user_by_username)):
-    my_courses = await get_my_course_list(user, session)
-    return {
-        "details":{
-            "success": True,
-            "message": "The list of courses",
-            "data": my_courses
-        }
-    }
+async def my_courses(session: SessionDep, response: Response, user: CurrentUser = Depends(get_current_user),
+                     after_id: int | None = None, limit: int | None = Query(default=None, gt=0, le=500)):
+    my_courses = await get_my_course_list(user, session, after_id, limit)
+    return envelope("The list of courses", my_courses, response)
 
 
 @router.get("/chapters/{course_id}")
-async def chapters(course_id: int, session: SessionDep, user = Depends(get_user_by_username)):
+async def chapters(course_id: int, session: ReadSessionDep, response: Response, user: CurrentUser = Depends(get_current_user)):
     chapters = await get_chapters_progress(course_id, user, session)
 
-    return {
-        "details": {
-            "success": True,
-            "message": f"The list of chapters for course with id:{course_id}",
-            "data": chapters
-        }
-    }
+    return envelope(f"The list of chapters for course with id:{course_id}", chapters, response)
 
 
 @router.get("/lessons/{chapter_id}")
-async def lessons(chapter_id: int, session: SessionDep, user: User = Depends(get_user_by_username)):
+async def lessons(chapter_id: int, session: ReadSessionDep, response: Response, user: CurrentUser = Depends(get_current_user)):
     lessons = await get_lessons_progress(chapter_id, user, session)
-    return {
-        "details": {
-            "success": True,
-            "Message": f"List of lessons for chapter with id:{chapter_id}",
-            "data": lessons
-        }
-    }
+    return envelope(f"List of lessons for chapter with id:{chapter_id}", lessons, response)
 
 @router.get("/lesson/{lesson_id}")
-async def lesson(lesson_id: int, session: SessionDep, user: User = Depends(get_user_by_username)):
+async def lesson(lesson_id: int, session: ReadSessionDep, response: Response, user: CurrentUser = Depends(get_current_user)):
     lesson = await get_lesson(user, lesson_id, session)
-    return {
-        "details": {
-            "success": True,
-            "Message": f"Full data for lesson with id:{lesson_id}",
-            "data": lesson
-        }
-    }
+    return envelope(f"Full data for lesson with id:{lesson_id}", lesson, response)
+
+
+@router.get("/lesson/{lesson_id}/comments")
+async def lesson_comments(lesson_id: int, session: ReadSessionDep, response: Response, user: CurrentUser = Depends(get_current_user),
+                          cursor: str | None = None,
+                          limit: int | None = Query(default=None, gt=0, le=config.COMMENTS_MAX_PAGE_SIZE)):
+    comments = await get_lesson_comments(lesson_id, session, cursor, limit)
+    return envelope(f"Comments for lesson with id:{lesson_id}", comments, response)
+
+
+@router.get("/quiz/{quiz_id}/comments")
+async def quiz_comments(quiz_id: int, session: ReadSessionDep, response: Response, user: CurrentUser = Depends(get_current_user),
+                        cursor: str | None = None,
+                        limit: int | None = Query(default=None, gt=0, le=config.COMMENTS_MAX_PAGE_SIZE)):
+    comments = await get_quiz_comments(quiz_id, session, cursor, limit)
+    return envelope(f"Comments for quiz with id:{quiz_id}", comments, response)
 
 
 @router.post("/enroll/{course_id}")
-async def enroll(course_id: int, session: SessionDep, user: User = Depends(get_user_by_username)):
-    user_course = await enroll_to_course(course_id, user, session)
+async def enroll(course_id: int, session: SessionDep, response: Response, user: CurrentUser = Depends(get_current_user)):
+    already_enrolled = await enroll_to_course(course_id, user, session)
 
-    if not user_course:
+    if not already_enrolled:
         message = f"User has successfully enrolled to course with id:{course_id}"
     else:
         message = f"User already enrolled to course with id:{course_id}"
-    return {
-            "details":{
-                "success": True,
-                "messsage": message,
-                "data": None,
+    return envelope(message, None, response)
+
+
+# bulk enrollment for cohort onboarding (admin only)
+@router.post("/enroll_many/{course_id}")
+async def enroll_many(course_id: int, user_ids: List[int], session: SessionDep, response: Response, user: CurrentUser = Depends(get_current_user)):
+    if not user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail={
+                "success": False,
+                "message": "Only administrators can enroll other users.",
+                "data": None
             }
-        }
+        )
+
+    enrolled_ids = await enroll_users_to_course(course_id, user_ids, session)
+    return envelope(f"{len(enrolled_ids)} users were enrolled to course with id:{course_id}", enrolled_ids, response)
 
 '''
 List of endpoints to prepare
@@ -99,7 +103,7 @@ List of endpoints to prepare
 3. load course chapters with progress === DONE
 4. load course lessons -> mark completed === DONE
 4.5 load lesson with comments(load comments as well) === DONE
-5. load course quizzes -> mark completed (load comments as well)
+5. load course quizzes -> mark completed (load comments as well) === DONE (api/quiz/{quiz_id})
 6. load notifications
 =========
 * load all user info required for entering the main page 
@@ -107,7 +111,7 @@ List of endpoints to prepare
 
 6. enroll to course === DONE
 6. read lesson -> update progress in database
-7. solve quiz -> update progress in database
+7. solve quiz -> update progress in database === DONE (api/quiz/{quiz_id}/submit)
 8. send comment to lesson or quiz
 9. send ticket
 10. rate ticket
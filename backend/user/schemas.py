@@ -77,12 +77,19 @@ class MyLessons(BaseModel):
         from_attributes = True
 
 
+class CommentPage(BaseModel):
+    comments: List[Comment]
+    next_cursor: str | None = None  # pass as cursor to get the next page, None on the last page
+
+
 class MyLesson(BaseModel):
     id: int
     title: str
     description: str
     materials: List[MyLessonMaterials]
-    comments: List[Comment]
+    comments: List[Comment]  # first page only, the rest via /lesson/{lesson_id}/comments
+    comment_count: int = 0
+    next_comment_cursor: str | None = None
 
     
     class Config:
@@ -1,62 +1,63 @@
-from models import User, Course, UserCourse, Chapter, Lesson, CommentLesson, UserLesson, UserQuiz, UserChapter
-from sqlalchemy import select
+from models import User, Course, UserCourse, Chapter, Lesson, Quiz, CommentLesson, CommentQuiz, UserLesson, UserQuiz, UserChapter
+from sqlalchemy import select, literal, false, func, and_, tuple_
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import load_only, selectinload, joinedload, with_loader_criteria
 from utils import internal_error
 from typing import List, Any
-from user.schemas import MyCourses, MyChapters, MyLessons, MyLesson
-from fastapi import Depends
+from user.schemas import MyCourses, MyChapters, MyLessons, MyLesson, MyQuizzes, MyLessonMaterials, Comment, CommentPage
+from fastapi import Depends, HTTPException, status
 from database import SessionDep, Base
+from guest.schemas import BaseCourse
+from guest.utils import get_cached_courses
+from user.progress import lesson_view_recorder
+from config import config
+from datetime import datetime
+from base64 import urlsafe_b64encode, urlsafe_b64decode
 
 
-# load list of all courses
-async def get_course_list(session: SessionDep) -> List[Course]:
-    statement = select(Course)
-    try:
-        data = await session.execute(statement)
-        courses = data.scalars().all()
-        return courses
-    except SQLAlchemyError:
-        raise internal_error
+# load list of all courses (shared with guest catalog cache)
+async def get_course_list(session: SessionDep) -> List[BaseCourse]:
+    return await get_cached_courses(session)
 
 
 # load list of courses with enrolled and progress percentage values
-async def get_course_list_progress(user: User, session: SessionDep) -> List[MyCourses] | None:
-    # get list of courses
-    guest_courses_list = await get_course_list(session)
-    
-    # change format of storage and add progress
-    user_courses_list = [MyCourses.model_validate(course) for course in guest_courses_list]
-
-    # load user courses with id, 
-    statement = select(UserCourse).filter(UserCourse.user_id == user.id).options(load_only(UserCourse.course_id, UserCourse.progress))
-    
+# enrollment and progress are resolved with a single LEFT JOIN, courses are paged by id (keyset pagination)
+async def get_course_list_progress(user: User, session: SessionDep, after_id: int | None = None, 
+                                   limit: int | None = None, enrolled_only: bool = False) -> List[MyCourses] | None:
+    enrollment = and_(UserCourse.course_id == Course.id, UserCourse.user_id == user.id)
+    statement = select(
+        Course.id,
+        Course.title,
+        Course.description,
+        func.coalesce(UserCourse.progress, 0.0).label("progress"),
+        UserCourse.id.is_not(None).label("enrolled")
+    ).order_by(Course.id)
+
+    # inner join is enough when only enrolled courses are required
+    if enrolled_only:
+        statement = statement.join(UserCourse, enrollment)
+    else:
+        statement = statement.outerjoin(UserCourse, enrollment)
+
+    if after_id is not None:
+        statement = statement.filter(Course.id > after_id)
+    if limit is not None:
+        statement = statement.limit(limit)
+
     try:
         data = await session.execute(statement)
-        enrolled_courses = data.scalars().all()
+        rows = data.all()
     except SQLAlchemyError:
         raise internal_error
-    
-    for enrolled_course in enrolled_courses:
-        for i in range(len(user_courses_list)):
-            if enrolled_course.course_id == user_courses_list[i].id:
-                user_courses_list[i].progress = enrolled_course.progress
-                user_courses_list[i].enrolled = True
-    return user_courses_list
+
+    return [MyCourses.model_validate(row) for row in rows]
                 
 
 # get data only on my courses
-async def get_my_course_list(user: User, session: SessionDep) -> List[MyCourses] | None:
-    # load all courses with enrolled and progress values
-    courses = await get_course_list_progress(user, session)
-    my_courses = []
-
-    # append to result only courses where user was enrolled
-    for course in courses:
-        if course.enrolled:
-            my_courses.append(course)
-
-    return my_courses
+async def get_my_course_list(user: User, session: SessionDep, after_id: int | None = None, 
+                             limit: int | None = None) -> List[MyCourses] | None:
+    return await get_course_list_progress(user, session, after_id, limit, enrolled_only=True)
 
 
 # # get any model by id
@@ -67,55 +68,56 @@ async def get_my_course_list(user: User, session: SessionDep) -> List[MyCourses]
 #     return item
 
 
+# chapters and lessons without order (or 0) are placed as order 1, ties keep creation order
+chapter_order = (func.coalesce(func.nullif(Chapter.order, 0), 1), Chapter.id)
+lesson_order = (func.coalesce(func.nullif(Lesson.order, 0), 1), Lesson.id)
+
+
 # get list of all chapters of a course
-async def get_chapters(course_id: int, session: SessionDep) -> MyChapters | None:
+async def get_chapters(course_id: int, session: SessionDep) -> List[MyChapters]:
     try:
-        statement =  select(Course).filter(Course.id == course_id).options(selectinload(Course.chapters))
+        statement = select(Chapter).filter(Chapter.course_id == course_id).order_by(*chapter_order)
         data = await session.execute(statement)
-        course = data.scalar_one_or_none()
-
-        course.chapters.sort(key=lambda x: x.order if x.order else 1)
 
-        my_cahpters = [MyChapters.model_validate(chapter) for chapter in course.chapters]
+        my_cahpters = [MyChapters.model_validate(chapter) for chapter in data.scalars().all()]
 
         return my_cahpters
     except SQLAlchemyError:
         raise internal_error
 
+
 # get list of all chapters of a course with progress
-async def get_chapters_progress(course_id:int, user: User, session: SessionDep):
-    chapters = await get_chapters(course_id, session)
+# only progress rows of this course's chapters are read (LEFT JOIN scoped to the user), ordered in SQL
+async def get_chapters_progress(course_id: int, user: User, session: SessionDep) -> List[MyChapters]:
+    user_chapter = and_(UserChapter.chapter_id == Chapter.id, UserChapter.user_id == user.id)
+    statement = select(
+        Chapter.id,
+        Chapter.title,
+        Chapter.order,
+        func.coalesce(UserChapter.progress, literal(0.0)).label("progress")
+    ).outerjoin(UserChapter, user_chapter).filter(Chapter.course_id == course_id).order_by(
+        *chapter_order
+    )
 
     try:
-        statement = select(User).filter(User.id == user.id).options(selectinload(User.chapters))
         data = await session.execute(statement)
-        my_chapters = data.scalar_one_or_none().chapters
-
-        for chapter in my_chapters:
-            for i in range(len(chapters)):
-                if chapter.chapter_id == chapters[i].id:
-                    chapters[i].progress = chapter.progress
-
-        return chapters
+        rows = data.all()
     except SQLAlchemyError:
         raise internal_error
-    
+
+    return [MyChapters.model_validate(row) for row in rows]
+
 
 # get list of all lessons of a chapter
 async def get_lessons(chapter_id: int, session: SessionDep) -> List[MyLessons]:
     try:
-        # load chapter based on id
-        statement =  select(Chapter).filter(Chapter.id == chapter_id).options(
-    selectinload(Chapter.lessons).options(selectinload(Lesson.quizzes)))
+        # load lessons of the chapter sorted by order
+        statement = select(Lesson).filter(Lesson.chapter_id == chapter_id).options(
+            selectinload(Lesson.quizzes)).order_by(*lesson_order)
         data = await session.execute(statement)
-        chapter = data.scalar_one_or_none()
-
-        # sort all lessons based on order
-        chapter.lessons.sort(key=lambda x: x.order if x.order else 1)
 
         # convert lesson to my lessons
-        my_lessons = [MyLessons.model_validate(lesson) for lesson in chapter.lessons]
-
+        my_lessons = [MyLessons.model_validate(lesson) for lesson in data.scalars().all()]
 
         return my_lessons
     except SQLAlchemyError as e:
@@ -123,143 +125,242 @@ async def get_lessons(chapter_id: int, session: SessionDep) -> List[MyLessons]:
 
 
 # get list of all lessons with progress
-async def get_lessons_progress(chapter_id: int, user: User, session: SessionDep):
-    # get list of lessons
-    lessons = await get_lessons(chapter_id, session)
-
-    lesson_ids = [lesson.id for lesson in lessons]
-    quiz_ids = []
-    for lesson in lessons:
-        quiz_ids.extend(
-            [quiz.id for quiz in lesson.quizzes]
-        )
+# lessons, quizzes and the user's progress come from a single LEFT JOIN query,
+# rows are grouped into lessons through a dict so the work is linear in the number of rows
+async def get_lessons_progress(chapter_id: int, user: User, session: SessionDep) -> List[MyLessons]:
+    user_lesson = and_(UserLesson.lesson_id == Lesson.id, UserLesson.user_id == user.id)
+    user_quiz = and_(UserQuiz.quiz_id == Quiz.id, UserQuiz.user_id == user.id)
+
+    statement = select(
+        Lesson.id.label("lesson_id"),
+        Lesson.title.label("lesson_title"),
+        Lesson.order.label("lesson_order"),
+        Lesson.description.label("lesson_description"),
+        func.coalesce(UserLesson.is_completed, false()).label("is_read"),
+        Quiz.id.label("quiz_id"),
+        Quiz.title.label("quiz_title"),
+        Quiz.description.label("quiz_description"),
+        func.coalesce(UserQuiz.is_completed, false()).label("quiz_completed"),
+        func.coalesce(UserQuiz.score, literal(0.0)).label("quiz_score")
+    ).outerjoin(UserLesson, user_lesson).outerjoin(Quiz, Quiz.lesson_id == Lesson.id).outerjoin(
+        UserQuiz, user_quiz
+    ).filter(Lesson.chapter_id == chapter_id).order_by(
+        *lesson_order, Quiz.id
+    )
 
     try:
-        # get list of lessons user has read
-        statement = select(User).filter(User.id == user.id).options(
-            selectinload(User.lessons), 
-            with_loader_criteria(UserLesson, UserLesson.lesson_id.in_(lesson_ids))).options(
-                selectinload(User.quizzes),
-                with_loader_criteria(UserQuiz, UserQuiz.quiz_id.in_(quiz_ids))
-                )
-
         data = await session.execute(statement)
-        user_data = data.scalar_one_or_none()
+        rows = data.all()
     except SQLAlchemyError:
         raise internal_error
-    
-    user_lessons = user_data.lessons
-    user_quizzes = user_data.quizzes
-
-    # update lessons is_read status
-    for lesson in user_lessons:
-        for i in range(len(lessons)):
-            if lesson.lesson_id == lessons[i].id:
-                lessons[i].is_read = lesson.is_completed
-    
-    # update quizzes is_completed and scores
-    for quiz in user_quizzes:
-        for i in range(len(lessons)):
-            for j in range(len(lessons[i].quizzes)):
-                if quiz.quiz_id == lessons[i].quizzes[j].id:
-                    lessons[i].quizzes[j].is_completed = quiz.is_completed
-                    lessons[i].quizzes[j].score = quiz.score
+
+    lessons = merge_lesson_progress(rows)
+
+    # views recorded by this process that are not written yet
+    for lesson in lessons:
+        if not lesson.is_read and lesson_view_recorder.is_pending(user.id, lesson.id):
+            lesson.is_read = True
 
     return lessons
 
-# load lesson with comments
-async def get_lesson(user: User, lesson_id: int, session: SessionDep):
-    try:
-        statement = select(Lesson).filter(Lesson.id == lesson_id).options(
-            selectinload(Lesson.materials)).options(
-                selectinload(Lesson.comments).options(selectinload(CommentLesson.user))
+
+# group joined lesson/quiz rows (ordered by lesson) into lessons with their quizzes
+def merge_lesson_progress(rows) -> List[MyLessons]:
+    lessons = {}
+    for row in rows:
+        lesson = lessons.get(row.lesson_id)
+        if lesson is None:
+            lesson = lessons[row.lesson_id] = MyLessons(
+                id=row.lesson_id,
+                title=row.lesson_title,
+                order=row.lesson_order,
+                description=row.lesson_description,
+                is_read=row.is_read,
+                quizzes=[]
             )
+        if row.quiz_id is not None:
+            lesson.quizzes.append(MyQuizzes(
+                id=row.quiz_id,
+                title=row.quiz_title,
+                description=row.quiz_description,
+                is_completed=row.quiz_completed,
+                score=row.quiz_score
+            ))
 
-        data = await session.execute(statement)
-        lesson = data.scalar_one_or_none()
+    return list(lessons.values())
 
-        full_lesson = MyLesson.model_validate(lesson)
 
-        # update database, mark lesson as read by user
-        statement = select(UserLesson).filter(
-            UserLesson.user_id == user.id, 
-            UserLesson.lesson_id == lesson_id
-        )
-        data = await session.execute(statement)
-        user_lesson = data.scalar_one_or_none()
+# load lesson with the first page of comments and the comment count
+async def get_lesson(user: User, lesson_id: int, session: SessionDep) -> MyLesson:
+    comment_count = select(func.count(CommentLesson.id)).filter(
+        CommentLesson.lesson_id == Lesson.id).scalar_subquery()
 
-        if user_lesson:
-            if not user_lesson.is_completed:
-                user_lesson.is_completed = True
-            
-                await session.commit()
-    except SQLAlchemyError as e:
+    try:
+        statement = select(Lesson, comment_count).filter(Lesson.id == lesson_id).options(
+            selectinload(Lesson.materials))
+
+        data = await session.execute(statement)
+        row = data.one_or_none()
+    except SQLAlchemyError:
         raise internal_error
 
+    if row is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={
+                "success": False,
+                "message": f"Lesson with id:{lesson_id} was not found.",
+                "data": None
+            }
+        )
+
+    lesson, count = row
+    comment_page = await get_lesson_comments(lesson_id, session)
+
+    full_lesson = MyLesson(
+        id=lesson.id,
+        title=lesson.title,
+        description=lesson.description,
+        materials=[MyLessonMaterials.model_validate(material) for material in lesson.materials],
+        comments=comment_page.comments,
+        comment_count=count,
+        next_comment_cursor=comment_page.next_cursor
+    )
+
+    # mark lesson as read by user, written in batches by the recorder
+    lesson_view_recorder.record(user.id, lesson_id)
+
     return full_lesson
 
 
-async def enroll_to_course(course_id: int, user:User, session: SessionDep):
+######## COMMENTS (keyset pagination by created_at, id) #########
+# cursor is the (created_at, id) of the last comment on the page, opaque for clients
+def encode_comment_cursor(created_at: datetime, comment_id: int) -> str:
+    return urlsafe_b64encode(f"{created_at.isoformat()}|{comment_id}".encode()).decode()
+
+
+def decode_comment_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        created_at, comment_id = urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(comment_id)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={
+                "success": False,
+                "message": "Invalid comment cursor.",
+                "data": None
+            }
+        )
+
+
+# one page of comments (oldest first) of a lesson or quiz
+async def get_comment_page(model: type[CommentLesson] | type[CommentQuiz], parent_filter, session: SessionDep,
+                           cursor: str | None = None, limit: int | None = None) -> CommentPage:
+    limit = limit or config.COMMENTS_PAGE_SIZE
+
+    # one extra row tells whether there is a next page
+    statement = select(model).filter(parent_filter).options(joinedload(model.user)).order_by(
+        model.created_at, model.id).limit(limit + 1)
+    if cursor is not None:
+        statement = statement.filter(tuple_(model.created_at, model.id) > tuple_(*decode_comment_cursor(cursor)))
+
     try:
-        # check if user already enrolled
-        statement = select(User).filter(User.id == user.id).options(
-            selectinload(User.courses), with_loader_criteria(UserCourse, UserCourse.course_id == course_id))
         data = await session.execute(statement)
-        user_courses = data.scalar_one_or_none().courses
-
-        if not user_courses:
-            statement = select(Course).filter(Course.id == course_id).options(
-                selectinload(Course.chapters).options(selectinload(Chapter.lessons).options(
-                    selectinload(Lesson.quizzes)
-                )))
-            data = await session.execute(statement)
-            course = data.scalar_one_or_none()
-
-            new_course = UserCourse(
-                user_id=user.id,
-                course_id = course.id,
-                chapter_total = len(course.chapters),
-                chapter_completed = 0,
-                is_completed = False,
-                progress = 0
-            )
+        comments = data.scalars().all()
+    except SQLAlchemyError:
+        raise internal_error
+
+    next_cursor = None
+    if len(comments) > limit:
+        comments = comments[:limit]
+        next_cursor = encode_comment_cursor(comments[-1].created_at, comments[-1].id)
+
+    return CommentPage(comments=[Comment.model_validate(comment) for comment in comments], next_cursor=next_cursor)
+
+
+async def get_lesson_comments(lesson_id: int, session: SessionDep, cursor: str | None = None,
+                              limit: int | None = None) -> CommentPage:
+    return await get_comment_page(CommentLesson, CommentLesson.lesson_id == lesson_id, session, cursor, limit)
+
+
+async def get_quiz_comments(quiz_id: int, session: SessionDep, cursor: str | None = None,
+                            limit: int | None = None) -> CommentPage:
+    return await get_comment_page(CommentQuiz, CommentQuiz.quiz_id == quiz_id, session, cursor, limit)
+
+
+# enroll users to course with set based INSERT ... SELECT from the course hierarchy
+# returns ids of users that were newly enrolled (already enrolled users and unknown ids are skipped)
+async def enroll_users_to_course(course_id: int, user_ids: List[int], session: SessionDep) -> List[int]:
+    try:
+        data = await session.execute(select(Course.id).filter(Course.id == course_id))
+        course_found = data.scalar_one_or_none()
+    except SQLAlchemyError:
+        raise internal_error
+
+    if course_found is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={
+                "success": False,
+                "message": f"Course with id:{course_id} was not found.",
+                "data": None
+            }
+        )
+
+    try:
+        chapter_total = select(func.count(Chapter.id)).filter(
+            Chapter.course_id == Course.id).scalar_subquery()
+        lesson_total = select(func.count(Lesson.id)).filter(
+            Lesson.chapter_id == Chapter.id).scalar_subquery()
+
+        # one row per user for the course, users that are already enrolled are skipped by the unique index
+        # (also when enrolled concurrently), RETURNING gives the users enrolled by this statement
+        data = await session.execute(insert(UserCourse).from_select(
+            ["user_id", "course_id", "chapter_total", "chapter_completed", "is_completed", "progress"],
+            select(User.id, Course.id, chapter_total, literal(0), false(), literal(0.0)).select_from(User).join(
+                Course, Course.id == course_id).filter(User.id.in_(user_ids))
+        ).on_conflict_do_nothing(index_elements=["user_id", "course_id"]).returning(UserCourse.user_id))
+        new_user_ids = data.scalars().all()
+
+        if not new_user_ids:
+            await session.commit()
+            return []
+
+        new_users = User.id.in_(new_user_ids)
+
+        # one row per user for every chapter of the course
+        await session.execute(insert(UserChapter).from_select(
+            ["user_id", "chapter_id", "lesson_total", "lesson_completed", "is_completed", "progress"],
+            select(User.id, Chapter.id, lesson_total, literal(0), false(), literal(0.0)).select_from(User).join(
+                Chapter, Chapter.course_id == course_id).filter(new_users)
+        ).on_conflict_do_nothing(index_elements=["user_id", "chapter_id"]))
+
+        # one row per user for every lesson of the course
+        await session.execute(insert(UserLesson).from_select(
+            ["user_id", "lesson_id", "is_completed", "progress"],
+            select(User.id, Lesson.id, false(), literal(0.0)).select_from(User).join(
+                Chapter, Chapter.course_id == course_id).join(
+                    Lesson, Lesson.chapter_id == Chapter.id).filter(new_users)
+        ).on_conflict_do_nothing(index_elements=["user_id", "lesson_id"]))
+
+        # one row per user for every quiz of the course
+        await session.execute(insert(UserQuiz).from_select(
+            ["user_id", "quiz_id", "score", "is_completed"],
+            select(User.id, Quiz.id, literal(0.0), false()).select_from(User).join(
+                Chapter, Chapter.course_id == course_id).join(
+                    Lesson, Lesson.chapter_id == Chapter.id).join(
+                        Quiz, Quiz.lesson_id == Lesson.id).filter(new_users)
+        ).on_conflict_do_nothing(index_elements=["user_id", "quiz_id"]))
 
-            session.add(new_course)
-
-            for chapter in course.chapters:
-                new_chapter = UserChapter(
-                    user_id = user.id,
-                    chapter_id = chapter.id,
-                    lesson_total = len(chapter.lessons),
-                    lesson_completed = 0,
-                    is_completed = False,
-                    progress = 0
-                )
-                session.add(new_chapter)
-
-                for lesson in chapter.lessons:
-                    new_lesson = UserLesson(
-                        user_id = user.id,
-                        lesson_id = lesson.id,
-                        is_completed = False,
-                        progress = 0
-                    )
-
-                    session.add(lesson)
-
-                    for quiz in lesson.quizzes:
-                        new_quiz = UserQuiz(
-                            user_id = user.id,
-                            quiz_id = quiz.id,
-                            score = 0,
-                            is_completed = False
-                        )
-
-                        session.add(new_quiz)
-        
         await session.commit()
     except SQLAlchemyError:
         raise internal_error
-    
-    return user_courses
 
+    return new_user_ids
+
+
+# enroll single user to course, returns True if user was already enrolled
+async def enroll_to_course(course_id: int, user: User, session: SessionDep) -> bool:
+    enrolled = await enroll_users_to_course(course_id, [user.id], session)
+    return not enrolled
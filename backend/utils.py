@@ -1,4 +1,6 @@
-from fastapi import HTTPException, status
+from fastapi import HTTPException, Response, status
+from pydantic_core import to_json
+from typing import Any
 
 internal_error = HTTPException(
     status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -8,3 +10,55 @@ internal_error = HTTPException(
         "data": None
     }
 )
+
+service_busy_error = HTTPException(
+    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+    detail={
+        "success": False,
+        "message": "Server is busy. Try again in a moment.",
+        "data": None
+    },
+    headers={"Retry-After": "1"}
+)
+
+
+class FastJSONResponse(Response):
+    '''
+    JSON response rendered by pydantic-core.
+    Pydantic models, datetimes and containers of them are serialized straight to bytes,
+    without the jsonable_encoder pass FastAPI runs for plain return values.
+    '''
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return to_json(content)
+
+
+class RawJSON(bytes):
+    '''
+    Already serialized JSON (e.g. a cached payload), embedded into envelopes as is.
+    '''
+
+
+# static part of {"<key>": {"success": true, "message": ..., "data": ...}}
+ENVELOPE_PREFIXES = {
+    key: b'{"' + key.encode() + b'":{"success":true,"message":'
+    for key in ("details", "detail")
+}
+
+
+# build success envelope as bytes, data may be any pydantic model / list of models / plain value / RawJSON
+# headers set on the injected Response (refreshed auth cookies) are copied, FastAPI drops them
+# when the handler returns a Response itself
+def envelope(message: str, data: Any = None, response: Response | None = None,
+             status_code: int = status.HTTP_200_OK, key: str = "details") -> FastJSONResponse:
+    body = ENVELOPE_PREFIXES[key] + to_json(message) + b',"data":' + (data if isinstance(data, RawJSON) else to_json(data)) + b'}}'
+    json_response = FastJSONResponse(body, status_code=status_code)
+    if response is not None:
+        json_response.raw_headers.extend(
+            (name, value) for name, value in response.raw_headers
+            if name not in (b"content-length", b"content-type")
+        )
+    return json_response